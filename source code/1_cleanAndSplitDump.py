@@ -1,6 +1,16 @@
-import bz2
 import os
 import re
+import threading
+from collections import deque
+from functools import partial
+from multiprocessing import Pool
+from queue import Empty, Full, Queue
+
+import ancestorIndex
+import classHierarchy
+import classIndex
+import parallelBz2
+import shards
 
 # wikidata prefixes for the shortening of the data
 prefixes = {'http://www.wikidata.org/entity/': 'wd:',
@@ -14,24 +24,97 @@ prefixes = {'http://www.wikidata.org/entity/': 'wd:',
 pattern_filter = '(<http:\/\/www\.wikidata\.org\/entity\/statement\/[^>]+> <http:\/\/www\.wikidata\.org\/prop\/statement\/(?!v)[^>]+> <[^>]+> \.)|(<http:\/\/www\.wikidata\.org\/entity\/statement\/[^>]+> <http:\/\/www\.wikidata\.org\/prop\/statement\/[^>]+> ".*\.)|(<http:\/\/www\.wikidata\.org\/entity\/statement\/[^\/]+> <http:\/\/www\.wikidata\.org\/prop\/qualifier\/[^\/]+> ".*\.)|(<http:\/\/www\.wikidata\.org\/entity\/statement\/[^\/]+> <http:\/\/www\.wikidata\.org\/prop\/qualifier\/[^\/]+> <.*\.)|(<http:\/\/www\.wikidata\.org\/entity\/[^>]+> <http:\/\/www\.wikidata\.org\/prop\/[^>]+> <http:\/\/www\.wikidata\.org\/entity\/statement\/.*\.)'
 pattern_replace = '(http:\/\/www.wikidata.org\/)(entity\/|prop\/)(statement\/|qualifier\/|direct\/|)(value-normalized\/|)'
 
+# the same for lines processed as bytes
+prefixes_bytes = {key.encode(): value.encode() for key, value in prefixes.items()}
+pattern_filter_bytes = pattern_filter.encode()
+pattern_replace_bytes = pattern_replace.encode()
+
+# number of lines passed at once to a filter process and number of batches a queue of the pipeline holds
+batch_size = 10000
+queue_batches = 16
+
+
+def split_processes(processes=None, filter_processes=None):
+    """
+    Shares the cores between the decompression and the filter processes, which run at the same time. A number which is
+    not given gets the cores the other pool leaves, if both are not given the cores are split in half.
+    :param processes: number of processes decompressing the dump, or None
+    :param filter_processes: number of processes cleaning the lines, or None
+    :return: tuple of (decompression processes, filter processes)
+    """
+    cores = os.cpu_count() or 1
+    if processes is None and filter_processes is None:
+        processes = max(1, cores // 2)
+    if processes is None:
+        processes = max(1, cores - filter_processes)
+    if filter_processes is None:
+        filter_processes = max(1, cores - processes)
+    return processes, filter_processes
 
-def work(source_file, dest_folder, dest_file):
+
+def work(source_file, dest_folder, dest_file, processes=None, binary=False, codec='bz2', level=None,
+         shard_lines=10000000, shard_bytes=None, P279_class_hierarchy_file=None, P31_class_hierarchy_file=None,
+         filter_processes=None, class_index_dir=None, ancestor_index=False):
     """
     Opens the .nt.bz2 dump as a stream for processing and calls construct_result.
+    If the files of the class hierarchies are given, the P279 class hierarchy and the P31 objects are extracted in the
+    same scan of the dump, like getP279ClassHierarchy and getP31Objects do.
     :param source_file: File Path of .bz2 dump
     :param dest_folder: Directory for computation results
     :param dest_file: File name of results
+    :param processes: number of processes decompressing the dump, see split_processes if None
+    :param binary: process the lines as bytes without decoding and encoding them
+    :param codec: the codec of the shards, one of shards.codec_extensions
+    :param level: the compression level, the default of the codec if None
+    :param shard_lines: maximum number of lines per shard, no limit if None
+    :param shard_bytes: maximum number of uncompressed bytes per shard, no limit if None
+    :param P279_class_hierarchy_file: the output file for the P279 class hierarchy, not extracted if None
+    :param P31_class_hierarchy_file: the output file for the P31 objects class hierarchy, not extracted if None
+    :param filter_processes: number of processes cleaning the lines, see split_processes if None
+    :param class_index_dir: the directory of the index of item -> P31 classes, which is built together with the P31
+    objects, not built if None
+    :param ancestor_index: build the index of the ancestors of every class with their minimum distance for analysis
+    from the P279 class hierarchy
     :return:
     """
-    # read sourcefile as stream
-    stream = bz2.open(source_file, 'rt')
+    processes, filter_processes = split_processes(processes, filter_processes)
+    print("Decompression processes:\t", processes, "\tfilter processes:\t", filter_processes)
+    # the pool is created before construct_result starts its threads, the stream is read by its producer thread
+    decompression_pool = Pool(processes)
+    # read sourcefile as stream, the bz2 blocks are decompressed in parallel
+    stream = parallelBz2.read_lines(source_file, processes, binary=binary, pool=decompression_pool)
+    # every line is also passed to the builders of the class hierarchies
+    hierarchy = dict()
+    all_p31_objects = set()
+    class_index = classIndex.ClassIndexWriter(class_index_dir) if class_index_dir is not None else None
+    consumers = []
+    if P279_class_hierarchy_file is not None:
+        consumers.append(partial(classHierarchy.add_P279_line, hierarchy=hierarchy))
+    if P31_class_hierarchy_file is not None:
+        consumers.append(partial(classHierarchy.add_P31_line, all_p31_objects=all_p31_objects,
+                                 class_index=class_index))
     # open a file for writing relevant lines of the source file
-    construct_result(stream, dest_folder, dest_file)
+    with decompression_pool:
+        construct_result(stream, dest_folder, dest_file, binary, codec, level, shard_lines, shard_bytes, consumers,
+                         filter_processes)
+    if P279_class_hierarchy_file is not None:
+        print("Class-counts:\t", len(hierarchy.keys()))
+        classHierarchy.write_P279_hierarchy(hierarchy, P279_class_hierarchy_file)
+        if ancestor_index:
+            class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
+            offsets, superclasses = classHierarchy.load_P279_arrays(class_hierarchy_dir)
+            ancestorIndex.write_ancestor_index(offsets, superclasses, class_hierarchy_dir)
+    if P31_class_hierarchy_file is not None:
+        print("Distinct Class-objects:\t", len(all_p31_objects))
+        classHierarchy.write_P31_objects(all_p31_objects, P31_class_hierarchy_file)
+    if class_index is not None:
+        print("P31 statements in the class index:\t", class_index.count)
+        class_index.close()
 
 
-def clean(line):
+def clean_regex(line):
     """
-    Cleans a line utilizing regex.
+    Cleans a line utilizing regex. Reference implementation of clean, used for lines which are no plain triple.
     :param line: the line to clean
     :return: cleaned line
     """
@@ -41,34 +124,345 @@ def clean(line):
     return line
 
 
-def construct_result(stream, dest_folder, dest_file):
+def clean_regex_bytes(line):
+    """
+    Cleans a line given as bytes utilizing regex. Reference implementation of clean_bytes.
+    :param line: the line to clean
+    :return: cleaned line
+    """
+    if len(re.findall(pattern_filter_bytes, line)) == 1:
+        for match in re.finditer(pattern_replace_bytes, line):
+            line = line.replace(match[0], dict.get(prefixes_bytes, match[0]), 1)
+    return line
+
+
+def build_clean(binary):
+    """
+    Builds the single pass cleaning of a line. Subject, predicate and object are located once, the line is kept or
+    dropped based on their IRI prefixes and the IRIs of kept lines are shortened with the prefixes. The filter only
+    looks at ASCII IRI prefixes, so the same logic works on decoded lines and on the raw bytes of the dump.
+    :param binary: build the function for lines as bytes instead of str
+    :return: the clean function
+    """
+
+    def literal(text):
+        return text.encode() if binary else text
+
+    # IRI prefixes and the triple tokenizer
+    http_www = literal('http://www')
+    wikidata_iri = literal('http://www.wikidata.org/')
+    entity_iri = literal('http://www.wikidata.org/entity/')
+    statement_term = literal('<http://www.wikidata.org/entity/statement/')
+    predicate_term = literal('> <http://www.wikidata.org/prop/')
+    triple_terms = re.compile(literal('<([^>]*)> <(http://www\\.wikidata\\.org/prop/[^>]*)> (.+)( \\.\n?)\\Z'))
+    line_prefixes = prefixes_bytes if binary else prefixes
+    regex = clean_regex_bytes if binary else clean_regex
+    entity_part, prop_part, value_normalized = literal('entity/'), literal('prop/'), literal('value-normalized/')
+    parts = (literal('statement/'), literal('qualifier/'), literal('direct/'))
+    wikidata, org = literal('wikidata'), literal('org/')
+    slash, greater, quote, less, datatype = (literal(c) for c in ('/', '>', '"', '<', '^^<'))
+    # ends of the IRI prefixes, the dots of pattern_replace match any character between www, wikidata and org/
+    wikidata_start = len(http_www) + 1
+    org_start = wikidata_start + len(wikidata) + 1
+    wikidata_end = len(wikidata_iri)
+    entity_end = len(entity_iri)
+    prop_end = len(wikidata_iri + prop_part)
+    statement_prop_end = prop_end + len(parts[0])
+    qualifier_prop_end = prop_end + len(parts[1])
+    statement_end = len(entity_iri + parts[0])
+    gap, separator = literal('> '), literal('> <')
+    # cache of the kind and shortened form per wikidata property predicate
+    predicate_kinds = dict()
+
+    def shorten(iri):
+        """
+        Replaces the wikidata prefix of an IRI like pattern_replace does.
+        :param iri: the IRI without angle brackets
+        :return: the shortened IRI, the unchanged IRI if it has no wikidata prefix or None if the prefix is unknown
+        """
+        namespace_end = iri.rfind(slash) + 1
+        prefix = line_prefixes.get(iri[:namespace_end])
+        if prefix is not None:
+            # the local name contains no slash, so the namespace is exactly what pattern_replace matches
+            return prefix + iri[namespace_end:]
+        if iri.startswith(wikidata_iri):
+            if iri.startswith(entity_part, wikidata_end):
+                end = entity_end
+            elif iri.startswith(prop_part, wikidata_end):
+                end = prop_end
+            else:
+                return iri
+            for part in parts:
+                if iri.startswith(part, end):
+                    end += len(part)
+                    break
+            if iri.startswith(value_normalized, end):
+                end += len(value_normalized)
+            prefix = line_prefixes.get(iri[:end])
+            return None if prefix is None else prefix + iri[end:]
+        elif iri.startswith(http_www) and iri.startswith(wikidata, wikidata_start) and iri.startswith(org, org_start):
+            # the dots of pattern_replace match any character
+            return None
+        return iri
+
+    def classify_predicate(predicate):
+        """
+        Decides which alternatives of pattern_filter a wikidata property allows as predicate. The results are cached,
+        because there are only a few distinct predicates in the dump.
+        :param predicate: the predicate IRI without angle brackets, starting with http://www.wikidata.org/prop/
+        :return: tuple of the kind of predicate and the shortened predicate
+        """
+        kind = predicate_kinds.get(predicate)
+        if kind is None:
+            if len(predicate) == prop_end:
+                kind = None
+            elif len(predicate) == qualifier_prop_end and predicate.endswith(parts[1]):
+                # [^\/]+ of the qualifier alternatives can match across the end of the empty property name
+                kind = 'invalid'
+            elif predicate.startswith(parts[0], prop_end) and len(predicate) > statement_prop_end:
+                kind = 'statement_value' if predicate.startswith(literal('v'), statement_prop_end) else 'statement'
+            elif (predicate.startswith(parts[1], prop_end) and len(predicate) > qualifier_prop_end
+                  and slash not in predicate[qualifier_prop_end:]):
+                kind = 'qualifier'
+            else:
+                kind = 'prop'
+            kind = (kind, shorten(predicate))
+            predicate_kinds[predicate] = kind
+        return kind
+
+    def clean(line):
+        """
+        Cleans a line in a single pass. Gives the same result as the regex reference implementation, lines which
+        cannot be decided by their three terms alone are passed to it.
+        :param line: the line to clean
+        :return: cleaned line
+        """
+        # every alternative of pattern_filter contains a wikidata property as predicate
+        if predicate_term not in line:
+            return line
+        terms = triple_terms.match(line)
+        if terms is None:
+            return regex(line)
+        subject, predicate, term, tail = terms.groups()
+        kind, predicate = classify_predicate(predicate)
+        if kind == 'invalid':
+            return regex(line)
+        # start of the IRI of the object or of the datatype of a literal object
+        if term.startswith(less):
+            if not term.endswith(greater):
+                return regex(line)
+            term_iri = 1
+        elif term.endswith(greater) and datatype in term:
+            term_iri = term.rfind(datatype) + 3
+        else:
+            term_iri = 0
+        # every occurrence of http://www has to be the start of a term, otherwise the regex could match inside a literal
+        term_http = term_iri > 0 and term.startswith(http_www, term_iri)
+        if line.count(http_www) != subject.startswith(http_www) + 1 + term_http:
+            return regex(line)
+        if kind is None or not subject.startswith(entity_iri) or len(subject) == entity_end:
+            return line
+        if term.startswith(statement_term):
+            pass
+        elif kind == 'prop' or not subject.startswith(parts[0], entity_end) or len(subject) == statement_end:
+            return line
+        elif kind == 'qualifier':
+            if slash in subject[statement_end:]:
+                return line
+            if not term.startswith((quote, less)):
+                # [^\/]+ of the qualifier alternatives can match across the end of the property name into the object
+                return regex(line) if gap in term else line
+        elif not term.startswith(quote) and (
+                kind == 'statement_value' or term_iri != 1 or len(term) == 2 or greater in term[1:-1]):
+            return line
+        subject = shorten(subject)
+        if term_http:
+            iri = shorten(term[term_iri:-1])
+            if iri is None:
+                return regex(line)
+            term = term[:term_iri] + iri + greater
+        if subject is None or predicate is None:
+            return regex(line)
+        return less + subject + separator + predicate + gap + term + tail
+
+    return clean
+
+
+clean = build_clean(False)
+clean_bytes = build_clean(True)
+
+
+def clean_batch(batch, binary=False):
+    """
+    Filter stage: cleans a batch of lines in a worker process.
+    :param batch: list of lines of the dump
+    :param binary: the lines are bytes
+    :return: list of the cleaned lines which are kept
+    """
+    clean_line = clean_bytes if binary else clean
+    batch_cleaned = []
+    for line in batch:
+        line_cleaned = clean_line(line)
+        if line_cleaned != line:
+            batch_cleaned.append(line_cleaned)
+    return batch_cleaned
+
+
+def put(queue, item, stop):
+    """
+    Puts an item into a bounded queue of the pipeline, gives up if the pipeline was stopped by an error.
+    :param queue: the queue
+    :param item: the item
+    :param stop: event which is set if a stage failed
+    :return: True if the item was put
+    """
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def get(queue, stop):
+    """
+    Gets an item from a queue of the pipeline, gives up if the pipeline was stopped by an error.
+    :param queue: the queue
+    :param stop: event which is set if a stage failed
+    :return: the item, None if the pipeline was stopped
+    """
+    while not stop.is_set():
+        try:
+            return queue.get(timeout=0.1)
+        except Empty:
+            pass
+    return None
+
+
+def produce_batches(stream, consumers, batches, stop):
+    """
+    Producer stage: passes every decompressed line to the consumers and puts the lines in batches into the queue.
+    :param stream: the .nt.bz2 dump stream
+    :param consumers: functions which additionally receive every line of the stream
+    :param batches: queue of the batches for the filter stage, None marks the end of the stream
+    :param stop: event which is set if a stage failed
+    :return:
+    """
+    batch = []
+    for line in stream:
+        for consumer in consumers:
+            consumer(line)
+        batch.append(line)
+        if len(batch) == batch_size:
+            if not put(batches, batch, stop):
+                return
+            batch = []
+    if batch:
+        put(batches, batch, stop)
+    put(batches, None, stop)
+
+
+def write_batches(writer, cleaned, stop):
+    """
+    Writer stage: writes the cleaned batches in their order into the shards, the compression runs in this thread.
+    :param writer: the shards.ShardWriter
+    :param cleaned: queue of the cleaned batches, None marks the end
+    :param stop: event which is set if a stage failed
+    :return:
+    """
+    while True:
+        batch_cleaned = get(cleaned, stop)
+        if batch_cleaned is None:
+            break
+        for line in batch_cleaned:
+            writer.write(line)
+
+
+def run_stage(stage, args, stop, errors):
+    """
+    Runs a stage of the pipeline in its thread and stops the whole pipeline if it fails.
+    :param stage: the function of the stage
+    :param args: the arguments of the stage
+    :param stop: event which is set if a stage failed
+    :param errors: list receiving the exception of a failed stage
+    :return:
+    """
+    try:
+        stage(*args)
+    except BaseException as error:
+        errors.append(error)
+        stop.set()
+
+
+def construct_result(stream, dest_folder, dest_file, binary=False, codec='bz2', level=None, shard_lines=10000000,
+                     shard_bytes=None, consumers=(), filter_processes=None):
     """
     Reads the stream and constructs the result without unnecessary data.
+    The work runs as a pipeline: a producer thread reads the decompressed lines and puts them in batches into a
+    bounded queue, a pool of filter processes cleans the batches and a writer thread compresses the cleaned batches
+    into the shards. The batches are written in the order of the dump, so the shards are the same as without pipeline.
+    The pools are forked before the threads start: the stream should use a pool created before construct_result is
+    called, see parallelBz2.read_lines.
     :param stream: the .nt.bz2 dump stream
     :param dest_folder: Directory for computation results
     :param dest_file: File name of results
-    :return:
+    :param binary: the stream returns bytes, which are filtered and written without decoding
+    :param codec: the codec of the shards, one of shards.codec_extensions
+    :param level: the compression level, the default of the codec if None
+    :param shard_lines: maximum number of lines per shard, no limit if None
+    :param shard_bytes: maximum number of uncompressed bytes per shard, no limit if None
+    :param consumers: functions which additionally receive every line of the stream
+    :param filter_processes: number of processes cleaning the lines, all cores if None, the processes decompressing the
+    stream should be subtracted
+    :return: the manifest of the shards
     """
-    fileindex = 0
-    outputline_counter = 0
-    fullpath = dest_folder + "\\" + f'{fileindex:04}' + "-" + dest_file
-    print("Output file:\t", fullpath)
-    file = bz2.open(fullpath, 'wt')
-    for line in stream:
-        if outputline_counter <= 10000000:
-            line_cleaned = clean(line)
-            if line_cleaned != line:
-                outputline_counter += 1
-                file.write(line_cleaned)
-        else:
-            file.close()
-            outputline_counter = 0
-            fileindex += 1
-            fullpath = dest_folder + "\\" + f'{fileindex:04}' + "-" + dest_file
-            print("Output file:\t", fullpath)
-            file = bz2.open(fullpath, 'wt')
-    file.close()
-    return
+    filter_processes = filter_processes or os.cpu_count()
+    writer = shards.ShardWriter(dest_folder, dest_file, codec, level, shard_lines, shard_bytes, binary)
+    # the bounded queues cap the memory if a stage is slower than the others
+    batches = Queue(queue_batches)
+    cleaned = Queue(queue_batches)
+    stop = threading.Event()
+    errors = []
+    producer_thread = threading.Thread(target=run_stage, args=(produce_batches, (stream, consumers, batches, stop),
+                                                               stop, errors), daemon=True)
+    writer_thread = threading.Thread(target=run_stage, args=(write_batches, (writer, cleaned, stop), stop, errors),
+                                     daemon=True)
+    pending = deque()
+    finished = False
+    # the filter processes are forked before the threads start, so none of them inherits a lock held by a thread
+    with Pool(filter_processes) as pool:
+        producer_thread.start()
+        writer_thread.start()
+        try:
+            while True:
+                # keep every filter process busy, but only wait for new batches if no batch is being cleaned
+                while not finished and len(pending) < filter_processes * 2:
+                    if pending:
+                        try:
+                            batch = batches.get_nowait()
+                        except Empty:
+                            break
+                    else:
+                        batch = get(batches, stop)
+                    if batch is None:
+                        finished = True
+                    else:
+                        pending.append(pool.apply_async(clean_batch, (batch, binary)))
+                if not pending:
+                    break
+                if not put(cleaned, pending.popleft().get(), stop):
+                    break
+            put(cleaned, None, stop)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            writer_thread.join()
+            producer_thread.join()
+    if errors:
+        raise errors[0]
+    return writer.close()
 
 
 if __name__ == '__main__':
@@ -82,4 +476,44 @@ if __name__ == '__main__':
     output_path = output_path.replace('"', '').replace("'", "")
     output_file_name_base = os.path.basename(input_file)
     assert os.path.exists(output_path), "Directory not found at:\t" + str(output_path)
-    work(input_file, output_path, output_file_name_base)
+    processes = input("Enter the number of decompression processes (Example: 8, leave empty to share the cores with "
+                      "the filter processes):\t")
+    processes = int(processes) if processes.strip() else None
+    filter_processes = input("Enter the number of filter processes (Example: 8, leave empty to use the cores the "
+                             "decompression processes leave):\t")
+    filter_processes = int(filter_processes) if filter_processes.strip() else None
+    binary = input("Do you want to process the lines as bytes without decoding them? (y/n):\t")
+    binary = binary.upper() == 'Y'
+    codec = input("Enter the codec of the output shards (" + "/".join(shards.available_codecs()) +
+                  ", leave empty for bz2):\t")
+    codec = codec.strip().lower() or 'bz2'
+    assert codec in shards.available_codecs(), "Codec not available:\t" + str(codec)
+    level = input("Enter the compression level (Example: 6, leave empty for the default of the codec):\t")
+    level = int(level) if level.strip() else None
+    shard_size = input("Enter the size of the shards in lines or bytes (Example: 10000000 or 2GB, leave empty for "
+                       "10000000 lines):\t")
+    shard_lines, shard_bytes = shards.parse_shard_size(shard_size) if shard_size.strip() else (10000000, None)
+    combined = input("Do you want to extract the P279 class hierarchy and the P31 objects in the same scan? (y/n):\t")
+    P279_class_hierarchy_file = None
+    P31_class_hierarchy_file = None
+    class_index_dir = None
+    ancestor_index = False
+    if combined.upper() == 'Y':
+        P279_class_hierarchy_file = input(
+            "Enter the path to store the P279 class hierarchy .json (Example: C:\dump\\analysis\class_hierarchy\class_hierarchy_P279.json):\t")
+        P279_class_hierarchy_file = P279_class_hierarchy_file.replace('"', '').replace("'", "")
+        class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
+        assert os.path.exists(class_hierarchy_dir), "Path not found at:\t" + str(class_hierarchy_dir)
+        P31_class_hierarchy_file = input(
+            "Enter the path to store the P31 class hierarchy .json (Example: C:\dump\\analysis\class_hierarchy\class_hierarchy_P31.json):\t")
+        P31_class_hierarchy_file = P31_class_hierarchy_file.replace('"', '').replace("'", "")
+        class_hierarchy_dir = os.path.dirname(P31_class_hierarchy_file)
+        assert os.path.exists(class_hierarchy_dir), "Path not found at:\t" + str(class_hierarchy_dir)
+        build_index = input("Do you want to build the index of the P31 classes of all items next to the P31 class "
+                            "hierarchy for getClassMembership? (y/n):\t")
+        if build_index.upper() == 'Y':
+            class_index_dir = class_hierarchy_dir
+        ancestor_index = input("Do you want to build the index of the ancestors of the classes for analysis? "
+                               "(y/n):\t").upper() == 'Y'
+    work(input_file, output_path, output_file_name_base, processes, binary, codec, level, shard_lines, shard_bytes,
+         P279_class_hierarchy_file, P31_class_hierarchy_file, filter_processes, class_index_dir, ancestor_index)
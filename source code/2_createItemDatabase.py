@@ -1,84 +1,136 @@
-import bz2
-import csv
 import json
 import os
-import re
+from functools import partial
+from multiprocessing import Pool
 
-# compile for efficient use
-grep_property_line = re.compile(
-    '(^<wd:[Qq][^>]+>\s<p:[Pp](?!31>|279>)[^>]+>\s<wds:[Qq][^>]+>)')  # to cache property p and wds node name to find all qualifiers, do not cache P31 or P279 lines, P31*** or P279*** will be matched :).
-grep_wds = re.compile(
-    '((?<=wds:)[Qq][^>]+)')  # we only want wds-Nodes from Wikidata Items, not from Wikidata Propertys like wds:P* as Subject
-grep_property = re.compile('((?<=p:)[Pp][^>]+)')
-grep_qualifier = re.compile('((?<=pq:)[Pp][^>]+)')
-grep_wditem = re.compile('^<wds?:([Qq][^->]+)')
+import itemDatabase
+import shards
+import statements
 
+# journal of the items found per shard, to resume an interrupted run
+journal_name = 'items.journal'
 
-def extractinformation(files, item_db_file_path, ext_ident_path):
+
+def extract_shard(filename, excluded):
+    """
+    Map step: collects the items of a single shard.
+    The qualifier lines at the start of the shard can belong to the last statement of the previous shard and the last
+    statement of this shard can be continued by the next shard, both are returned separately for the merge.
+    :param filename: the shard
+    :param excluded: set of properties whose items are skipped
+    :return: tuple of (qualifiers before the first statement as (statement node, qualifier), items of the finished
+     statements in order of discovery, the unfinished last statement or None if no statement starts in the shard)
+    """
+    head = []
+    # the empty entity marks the start of the shard, it is finished by the first property line of the shard
+    statement = ['', None, None, set()]
+    started = False
+    items = dict()
+    stream = shards.open_shard(filename, 'rt')
+    for finished in statements.parse_statements(stream, statement, head):
+        if finished[0] == '':
+            started = True
+            continue
+        fimi_tuple = statements.fimi_item(finished, excluded)
+        if fimi_tuple is not None:
+            items[fimi_tuple] = None
+    stream.close()
+    print("File:\t", filename)
+    return head, list(items), statement if started else None
+
+
+def read_journal(journal_path, files):
+    """
+    Reads the journal of a previous run to resume it after the last completed shard. A record which was only partially
+    written when the run was interrupted is cut off.
+    :param journal_path: the journal file
+    :param files: the shards in their order
+    :return: tuple of (item database, unfinished statement after the last completed shard, number of completed shards)
     """
-    Constructs the item database for frequent itemset mining utilizing regexes.
+    item_dict = dict()
+    statement = [None, None, None, set()]
+    completed = 0
+    valid_size = 0
+    with open(journal_path, 'rb') as journal:
+        for record_line in journal:
+            if not record_line.endswith(b'\n'):
+                break
+            record = json.loads(record_line)
+            if completed >= len(files) or record['shard'] != completed or \
+                    record['file'] != os.path.basename(files[completed]):
+                raise ValueError('The journal does not belong to the shards, record:\t' + str(record_line))
+            for fimi_tuple in record['items']:
+                item_dict[tuple(fimi_tuple)] = len(item_dict)
+            statement = record['statement'][:3] + [set(record['statement'][3])]
+            completed += 1
+            valid_size += len(record_line)
+    with open(journal_path, 'r+b') as journal:
+        journal.truncate(valid_size)
+    return item_dict, statement, completed
+
+
+def extractinformation(files, item_db_file_path, ext_ident_path, processes=1, resume=False):
+    """
+    Constructs the item database for frequent itemset mining from the statements of the cleaned dump.
+    With more than one process every shard is processed by its own worker process, the results are merged in the order
+    of the shards, so the items always get the same ids.
+    After each shard the new items and the unfinished statement are appended to a journal, so an interrupted run can be
+    resumed after the last completed shard. The items.json and items.bin are written once at the end.
     :param files: The files to process.
     :param item_db_file_path: The path to where the item database will be stored.
     :param ext_ident_path: The path to the external identifiers file.
+    :param processes: number of worker processes, all cores if None, 1 processes the shards in this process
+    :param resume: continue the run recorded in the journal instead of starting a new one
     :return:
     """
-    # reading external identifiers
-    ext_identifiers = []
-    with open(ext_ident_path, newline='') as external_identifier_csv:
-        for row in csv.reader(external_identifier_csv):
-            ext_identifiers.append(row[0])
-    temp_prop = ''
-    temp_wds = ''
-    qualifier_set = set()
-    item_dict = dict()
-    item_counter = 0
-    fileindex = 0
-    for filename in files:
-        print("File:\t", filename)
-        stream = bz2.open(filename, 'rt')
-        for line in stream:
-            if len(re.findall(grep_wds, line)) != 0 and re.findall(grep_wds, line)[0].upper() == temp_wds:
-                if len(re.findall(grep_qualifier, line)) == 1:
-                    qualifier = re.findall(grep_qualifier, line)[0].upper()
-                    qualifier_set.add(qualifier)
-                else:
-                    pass
-                    # print("Line not needed, ps: or <wd:Q> <p:P> <wds:Q> handled in next operation!")
-            else:
-                # Use the FIMI as key, value as FIMI Counter, check if there is at least one qualifier
-                fimi_tuple = tuple([temp_prop] + list(sorted(qualifier_set)))
-                # properties P3921 and P4316 contain sparql queries as values and destroy the database format, they are skipped
-                if len(fimi_tuple) < 2 or fimi_tuple in item_dict.keys() or ext_identifiers.count(
-                        temp_prop) == 1 or temp_prop == 'P3921' or temp_prop == 'P4316':
-                    pass
-                    # print("Item of previous statement already present or is too short or external identifier, skipping item")
-                else:
-                    item_dict[fimi_tuple] = item_counter
-                    item_counter += 1
-                qualifier_set = set()
-            if len(re.findall(grep_property_line, line)) == 1:
-                if len(re.findall(grep_property, line)) == 1 and len(re.findall(grep_wds, line)) == 1:
-                    temp_prop = re.findall(grep_property, line)[0].upper()
-                    temp_wds = re.findall(grep_wds, line)[0].upper()
-        stream.close()
-        with open(item_db_file_path + '\\' + f'{fileindex:04}' + '-items.json', 'w') as file:
-            file.write(json.dumps({str(k): v for k, v in item_dict.items()}))
-            file.close()
-        fileindex += 1
-
-    fimi_tuple = tuple([temp_prop] + list(sorted(qualifier_set)))
-    if len(fimi_tuple) < 2 or fimi_tuple in item_dict.keys() or ext_identifiers.count(
-            temp_prop) == 1 or temp_prop == 'P3921' or temp_prop == 'P4316':
-        pass
-        # print("Item of previous statement already present or is too short, skipping this item now")
+    excluded = statements.read_excluded_properties(ext_ident_path)
+    journal_path = item_db_file_path + '\\' + journal_name
+    if resume and os.path.exists(journal_path):
+        item_dict, statement, completed = read_journal(journal_path, files)
+        print("Resuming after shard", completed, "with", len(item_dict), "items")
     else:
-        item_dict[fimi_tuple] = item_counter
-        item_counter += 1
+        item_dict, statement, completed = dict(), [None, None, None, set()], 0
+        open(journal_path, 'w').close()
+    new_items = []
+
+    def add_item(fimi_tuple):
+        if fimi_tuple is not None and fimi_tuple not in item_dict:
+            item_dict[fimi_tuple] = len(item_dict)
+            new_items.append(list(fimi_tuple))
+
+    pool = Pool(processes) if processes != 1 else None
+    results = pool.imap(partial(extract_shard, excluded=excluded), files[completed:]) if pool is not None else map(
+        partial(extract_shard, excluded=excluded), files[completed:])
+    try:
+        with open(journal_path, 'a') as journal:
+            for fileindex, (head, items, shard_statement) in enumerate(results, completed):
+                # reduce step: continue the last statement of the previous shard with the head of this shard
+                for node, qualifier in head:
+                    if statement[0] is not None and node == statement[1]:
+                        statement[3].add(qualifier)
+                if shard_statement is not None:
+                    if statement[0] is not None:
+                        add_item(statements.fimi_item(statement, excluded))
+                    for fimi_tuple in items:
+                        add_item(fimi_tuple)
+                    statement = shard_statement
+                record = {'shard': fileindex, 'file': os.path.basename(files[fileindex]), 'items': new_items,
+                          'statement': statement[:3] + [sorted(statement[3])]}
+                journal.write(json.dumps(record) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+                new_items.clear()
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if statement[0] is not None:
+        add_item(statements.fimi_item(statement, excluded))
     print("Writing final Item Database!")
     with open(item_db_file_path + '\\items.json', 'w') as file:
         # convert keys to string before dumping
         file.write(json.dumps({str(k): v for k, v in item_dict.items()}))
-        file.close()
+    # the binary item database is loaded by createTransactionDatabase without parsing
+    itemDatabase.write_item_database(item_dict, item_db_file_path + '\\items.bin')
     print("Finished creating item database!")
 
 
@@ -91,17 +143,24 @@ if __name__ == '__main__':
     input_path = input_path.replace('"', '').replace("'", "")
     assert os.path.exists(input_path), "Path not found at:\t" + str(input_path)
     item_db_file_path = input(
-        "Enter the directory to store the item databases (one each dump shard) (Example: C:\dump\itemdb):\t")
+        "Enter the directory to store the item database and its journal (Example: C:\dump\itemdb):\t")
     item_db_file_path = item_db_file_path.replace('"', '').replace("'", "")
     assert os.path.exists(item_db_file_path), "File not found at:\t" + str(item_db_file_path)
     ext_ident_path = input(
         "Enter the path to the external identifiers file (Example: C:\dump\external_identifiers_optimization.csv):\t")
     ext_ident_path = ext_ident_path.replace('"', '').replace("'", "")
     assert os.path.exists(ext_ident_path), "File not found at:\t" + str(ext_ident_path)
-    # get filelist of provided path
-    file_list = next(os.walk(input_path))[2]
-    file_list_fullpath = []
-    for file in file_list:
-        file_list_fullpath.append(os.path.join(input_path, file))
+    # get filelist of provided path, in the order of the manifest if there is one
+    file_list_fullpath = shards.list_shards(input_path)
     # print("Files: ", file_list_fullpath)
-    extractinformation(file_list_fullpath, item_db_file_path, ext_ident_path)
+    resume = False
+    if os.path.exists(item_db_file_path + '\\' + journal_name):
+        resume = input("Found the journal of a previous run, do you want to resume it? (y/n):\t")
+        resume = resume.upper() == 'Y'
+    parallel = input("Do you want to process the shards in parallel? (y/n):\t")
+    if parallel.upper() == 'Y':
+        processes = input("Enter the number of worker processes (Example: 64, leave empty to use all cores):\t")
+        processes = int(processes) if processes.strip() else None
+        extractinformation(file_list_fullpath, item_db_file_path, ext_ident_path, processes, resume)
+    else:
+        extractinformation(file_list_fullpath, item_db_file_path, ext_ident_path, resume=resume)
@@ -1,66 +1,115 @@
-import bz2
 import json
 import os
-import re
 from ast import literal_eval
+from multiprocessing import Pool
 
-grep_property_line = re.compile('(^<wd:[Qq][^>]+>\s<p:[Pp][^>]+>\s<wds:[Qq][^>]+>)')
-grep_wds = re.compile('((?<=wds:)[Qq][^>]+)')
-grep_property = re.compile('((?<=p:)[Pp][^>]+)')
-grep_qualifier = re.compile('((?<=pq:)[Pp][^>]+)')
-grep_wditem = re.compile('^<wds?:([Qq][^->]+)')
-match_instance = re.compile('((?<=p:)[Pp]31(?=>))')
+import itemDatabase
+import shards
+import statements
+import transactionDatabase
 
+# the item database of a worker process of the parallel mode
+worker_items = None
 
-def create_transaction(item_cache, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item):
+
+def build_transaction(item_statements, dict_all_items):
+    """
+    Builds the transaction of an item from its statements.
+    :param item_statements: list of statements (entity, statement node, property, qualifier set) of an item
+    :param dict_all_items: the item database, a dict or an itemDatabase.ItemDatabase
+    :return: the sorted item ids, None if the item has no transaction
+    """
+    transaction = set()
+    has_instance = False
+    for statement in item_statements:
+        if statement[2] == 'P31':
+            has_instance = True
+        if len(statement[3]) != 0:
+            dict_tuple = tuple([statement[2]] + list(sorted(statement[3])))
+            item_id = dict_all_items.get(dict_tuple)
+            if item_id is not None:
+                transaction.add(item_id)
+    if len(transaction) != 0 and has_instance is True:
+        return sorted(transaction)
+    return None
+
+
+def write_transaction(temp_wditem, sorted_transaction, file_wd_transaction, file_wd_item, transaction_writer=None):
+    """
+    Writes a transaction into the transaction database.
+    :param temp_wditem: the item the transaction is about
+    :param sorted_transaction: the sorted item ids
+    :param file_wd_transaction: the output file for the transaction database
+    :param file_wd_item: the outputfile for the Wikidata items corresponding to the transaction database
+    :param transaction_writer: transactionDatabase.TransactionWriter of the binary transaction database, or None
+    :return:
+    """
+    final_transaction = " ".join(list(map(str, sorted_transaction)))
+    file_wd_transaction.write(final_transaction)
+    file_wd_item.write(temp_wditem + "\n")
+    file_wd_transaction.write("\n")
+    if transaction_writer is not None:
+        transaction_writer.add(temp_wditem, sorted_transaction)
+
+
+def create_transaction(item_statements, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item,
+                       transaction_writer=None):
     """
     Creates the transaction string for the transaction database
-    :param item_cache: list of strings to construct a transaction
+    :param item_statements: list of statements (entity, statement node, property, qualifier set) of an item
     :param temp_wditem: a temporary variable to know about which item the transaction is about
-    :param dict_all_items: the item database
+    :param dict_all_items: the item database, a dict or an itemDatabase.ItemDatabase
     :param file_wd_transaction: the output file for the transaction database
     :param file_wd_item: the outputfile for the Wikidata items corresponding to the transaction database
+    :param transaction_writer: transactionDatabase.TransactionWriter of the binary transaction database, or None
     :return:
     """
-    temp_prop = ''
-    final_transaction = ''
-    temp_wds = ''
-    qualifier_set = set()
-    transaction = []
-    has_instance = False
-    for item_line in item_cache:
-        if len(re.findall(match_instance, item_line)) == 1:
-            has_instance = True
-        if re.findall(grep_wds, item_line)[0].upper() == temp_wds:
-            if len(re.findall(grep_qualifier, item_line)) == 1:
-                qualifier = re.findall(grep_qualifier, item_line)[0].upper()
-                qualifier_set.add(qualifier)
-            else:
-                pass
-                # print("Line not needed, ps: or <wd:Q> <p:P> <wds:Q> handled in next operation!")
-        else:
-            dict_tuple = tuple([temp_prop] + list(sorted(qualifier_set)))
-            if dict_tuple in dict_all_items.keys() and len(dict_tuple) >= 2:
-                if transaction.count(dict_all_items[dict_tuple]) == 0:
-                    transaction.append(dict_all_items[dict_tuple])
-                final_transaction = " ".join(list(map(str, sorted(transaction))))
-                qualifier_set = set()
-            else:
-                qualifier_set = set()
-        if len(re.findall(grep_property_line, item_line)) == 1:
-            if len(re.findall(grep_property, item_line)) == 1 and len(re.findall(grep_wds, item_line)) == 1:
-                temp_prop = re.findall(grep_property, item_line)[0].upper()
-                temp_wds = re.findall(grep_wds, item_line)[0].upper()
-    if len(qualifier_set) != 0:
-        dict_tuple = tuple([temp_prop] + list(sorted(qualifier_set)))
-        if dict_tuple in dict_all_items.keys() and len(dict_tuple) >= 2:
-            if transaction.count(dict_all_items[dict_tuple]) == 0:
-                transaction.append(dict_all_items[dict_tuple])
-            final_transaction = " ".join(list(map(str, sorted(transaction))))
-    if temp_wditem != '' and final_transaction != '' and has_instance is True:
-        file_wd_transaction.write(final_transaction)
-        file_wd_item.write(temp_wditem + "\n")
-        file_wd_transaction.write("\n")
+    sorted_transaction = build_transaction(item_statements, dict_all_items)
+    if temp_wditem != '' and sorted_transaction is not None:
+        write_transaction(temp_wditem, sorted_transaction, file_wd_transaction, file_wd_item, transaction_writer)
+
+
+def load_item_database(item_db_file_path):
+    """
+    Loads the item database, the binary items.bin is memory mapped and the items.json is parsed.
+    :param item_db_file_path: the path to the item database.
+    :return: dict or itemDatabase.ItemDatabase of FIMI tuple -> item id
+    """
+    if item_db_file_path.endswith('.bin'):
+        return itemDatabase.ItemDatabase(item_db_file_path)
+    with open(item_db_file_path, "r") as filehandle:
+        obj = json.load(filehandle)
+    return {literal_eval(k): v for k, v in obj.items()}
+
+
+def write_transactions(statement_stream, dict_all_items, transaction_db_path):
+    """
+    Groups the statements by item and writes the transaction database.
+    :param statement_stream: the statements of the cleaned dump
+    :param dict_all_items: the item database
+    :param transaction_db_path: the path to where the transaction database will be stored.
+    :return:
+    """
+    file_wd_item = open(transaction_db_path + "\\tid.txt", "w")
+    file_wd_transaction = open(transaction_db_path + "\\transaction.dat", "w")
+    # the same transactions in compressed sparse row form, which can be memory mapped with numpy
+    transaction_writer = transactionDatabase.TransactionWriter(transaction_db_path)
+    item_statements = []
+    temp_wditem = ''
+    # the statements of an item follow each other in the dump
+    for statement in statement_stream:
+        if statement[0] != temp_wditem:
+            create_transaction(item_statements, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item,
+                               transaction_writer)
+            item_statements = []
+            temp_wditem = statement[0]
+        item_statements.append(statement)
+    print("Last item statements:\t", len(item_statements))
+    create_transaction(item_statements, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item,
+                       transaction_writer)
+    file_wd_item.close()
+    file_wd_transaction.close()
+    transaction_writer.close()
 
 
 def create_horizontal_database(files, item_db_file_path, transaction_db_path):
@@ -71,38 +120,155 @@ def create_horizontal_database(files, item_db_file_path, transaction_db_path):
     :param transaction_db_path: the path to where the transaction database will be stored.
     :return:
     """
+    dict_all_items = load_item_database(item_db_file_path)
+    write_transactions(statements.read_statements(files), dict_all_items, transaction_db_path)
+    print("Finished creating the transaction database")
+
+
+def init_worker(item_db_file_path):
+    """
+    Loads the item database once per worker process.
+    :param item_db_file_path: the path to the item database.
+    :return:
+    """
+    global worker_items
+    worker_items = load_item_database(item_db_file_path)
+
+
+def transactions_of_shard(filename):
+    """
+    Map step: creates the transactions of the items of a single shard in a worker process.
+    Only the items in the middle of the shard are complete. The statements of the first item can continue an item of
+    the previous shard and those of the last item can be continued by the next shard, so they are returned for the
+    merge together with the qualifier lines before the first statement and the unfinished last statement.
+    :param filename: the shard
+    :return: tuple of (qualifiers before the first statement as (statement node, qualifier), statements of the first
+     item, (item, sorted item ids) of the complete items, statements of the last item, the unfinished last statement or
+     None if no statement starts in the shard)
+    """
+    head = []
+    # the empty entity marks the start of the shard, it is finished by the first property line of the shard
+    statement = ['', None, None, set()]
+    started = False
+    first_statements = None
+    item_statements = []
+    transactions = []
+    stream = shards.open_shard(filename, 'rt')
+    for finished in statements.parse_statements(stream, statement, head):
+        if finished[0] == '':
+            started = True
+            continue
+        if len(item_statements) != 0 and item_statements[0][0] != finished[0]:
+            if first_statements is None:
+                first_statements = item_statements
+            else:
+                sorted_transaction = build_transaction(item_statements, worker_items)
+                if sorted_transaction is not None:
+                    transactions.append((item_statements[0][0], sorted_transaction))
+            item_statements = []
+        item_statements.append(finished)
+    stream.close()
+    print("File:\t", filename)
+    if first_statements is None:
+        first_statements, item_statements = item_statements, []
+    return head, first_statements, transactions, item_statements, statement if started else None
+
+
+def create_horizontal_database_parallel(files, item_db_file_path, transaction_db_path, processes=None):
+    """
+    Creates the same transaction database as create_horizontal_database, but each shard is processed by its own
+    worker process. The items at the shard boundaries are completed in the merge step, which writes the transactions
+    in the order of the shards.
+    :param files: the files to process.
+    :param item_db_file_path: the path to the item database.
+    :param transaction_db_path: the path to where the transaction database will be stored.
+    :param processes: number of worker processes, all cores if None
+    :return:
+    """
+    dict_all_items = load_item_database(item_db_file_path)
     file_wd_item = open(transaction_db_path + "\\tid.txt", "w")
     file_wd_transaction = open(transaction_db_path + "\\transaction.dat", "w")
-    with open(item_db_file_path, "r") as filehandle:
-        obj = json.load(filehandle)
-    dict_all_items = {literal_eval(k): v for k, v in obj.items()}
-    item_cache = []
-    temp_wditem = ''
-    for file in files:
-        print("File:\t", file)
-        stream = bz2.open(file, 'rt')
-        for line in stream:
-            if len(re.findall(grep_wditem, line)) == 1:
-                wditem = re.findall(grep_wditem, line)[0].upper()
-                if re.findall(grep_wditem, line)[0].upper() == temp_wditem:
-                    item_cache.append(line)
-                else:
-                    create_transaction(item_cache, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item)
-                    item_cache = []
-                    temp_wditem = wditem
-                    item_cache.append(line)
-            else:
-                if len(re.findall('<wds?:[Pp]', line)[0]) > 0:
-                    pass
-                else:
-                    print("Line:\t", line)
-                    print("Error in dump! No WD-Item could be found!")
-        stream.close()
-    print("Last item cache length:\t", len(item_cache))
-    create_transaction(item_cache, temp_wditem, dict_all_items, file_wd_transaction, file_wd_item)
+    transaction_writer = transactionDatabase.TransactionWriter(transaction_db_path)
+    # statements of the item which can still continue, and the unfinished statement
+    item_statements = []
+    statement = [None, None, None, set()]
+
+    def add_statement(finished):
+        if len(item_statements) != 0 and item_statements[0][0] != finished[0]:
+            create_transaction(item_statements, item_statements[0][0], dict_all_items, file_wd_transaction,
+                               file_wd_item, transaction_writer)
+            item_statements.clear()
+        item_statements.append(finished)
+
+    with Pool(processes, initializer=init_worker, initargs=(item_db_file_path,)) as pool:
+        for head, first_statements, transactions, last_statements, shard_statement in pool.imap(
+                transactions_of_shard, files):
+            # reduce step: continue the unfinished statement and the last item of the previous shard
+            for node, qualifier in head:
+                if statement[0] is not None and node == statement[1]:
+                    statement[3].add(qualifier)
+            if shard_statement is None:
+                continue
+            if statement[0] is not None:
+                add_statement(tuple(statement))
+            for finished in first_statements:
+                add_statement(finished)
+            if len(transactions) != 0 or len(last_statements) != 0:
+                create_transaction(item_statements, item_statements[0][0] if item_statements else '',
+                                   dict_all_items, file_wd_transaction, file_wd_item, transaction_writer)
+                for temp_wditem, sorted_transaction in transactions:
+                    write_transaction(temp_wditem, sorted_transaction, file_wd_transaction, file_wd_item,
+                                      transaction_writer)
+                item_statements[:] = last_statements
+            statement = shard_statement
+    if statement[0] is not None:
+        add_statement(tuple(statement))
+    print("Last item statements:\t", len(item_statements))
+    create_transaction(item_statements, item_statements[0][0] if item_statements else '', dict_all_items,
+                       file_wd_transaction, file_wd_item, transaction_writer)
+    file_wd_item.close()
+    file_wd_transaction.close()
+    transaction_writer.close()
     print("Finished creating the transaction database")
 
 
+def assign_items(statement_stream, item_dict, excluded):
+    """
+    Assigns the item ids while the statements are read, in the order createItemDatabase assigns them.
+    :param statement_stream: the statements of the cleaned dump
+    :param item_dict: dict of FIMI tuple -> item id, which receives the new items
+    :param excluded: set of properties whose items are skipped
+    :return: generator of the statements
+    """
+    for statement in statement_stream:
+        fimi_tuple = statements.fimi_item(statement, excluded)
+        if fimi_tuple is not None and fimi_tuple not in item_dict:
+            item_dict[fimi_tuple] = len(item_dict)
+        yield statement
+
+
+def create_fused_databases(files, item_db_file_path, ext_ident_path, transaction_db_path):
+    """
+    Creates the item database and the transaction database in a single pass over the cleaned dump. The items get the
+    same ids as in createItemDatabase, so the output is the same as running both scripts.
+    :param files: the files to process.
+    :param item_db_file_path: the directory to store the item database.
+    :param ext_ident_path: The path to the external identifiers file.
+    :param transaction_db_path: the path to where the transaction database will be stored.
+    :return:
+    """
+    excluded = statements.read_excluded_properties(ext_ident_path)
+    item_dict = dict()
+    write_transactions(assign_items(statements.read_statements(files), item_dict, excluded), item_dict,
+                       transaction_db_path)
+    print("Writing final Item Database!")
+    with open(item_db_file_path + '\\items.json', 'w') as file:
+        # convert keys to string before dumping
+        file.write(json.dumps({str(k): v for k, v in item_dict.items()}))
+    itemDatabase.write_item_database(item_dict, item_db_file_path + '\\items.bin')
+    print("Finished creating the item and transaction database")
+
+
 if __name__ == '__main__':
     """
     The main method reads paths and makes sure they exist before calculations start.
@@ -110,16 +276,34 @@ if __name__ == '__main__':
     input_path = input("Enter the directory of the cleaned and splitted .nt.bz2 dump (Example: C:\dump\cleaned_dump):\t")
     input_path = input_path.replace('"', '').replace("'", "")
     assert os.path.exists(input_path), "Path not found at:\t" + str(input_path)
-    item_db_file_path = input("Enter the path to the item database (Example: C:\dump\itemdb\items.json):\t")
-    item_db_file_path = item_db_file_path.replace('"', '').replace("'", "")
-    assert os.path.exists(item_db_file_path), "File not found at:\t" + str(item_db_file_path)
+    fused = input("Do you want to create the item database in the same pass? (y/n):\t")
+    fused = fused.upper() == 'Y'
+    if fused:
+        item_db_file_path = input("Enter the directory to store the item database (Example: C:\dump\itemdb):\t")
+        item_db_file_path = item_db_file_path.replace('"', '').replace("'", "")
+        assert os.path.exists(item_db_file_path), "Path not found at:\t" + str(item_db_file_path)
+        ext_ident_path = input("Enter the path to the external identifiers file "
+                               "(Example: C:\dump\external_identifiers_optimization.csv):\t")
+        ext_ident_path = ext_ident_path.replace('"', '').replace("'", "")
+        assert os.path.exists(ext_ident_path), "File not found at:\t" + str(ext_ident_path)
+    else:
+        item_db_file_path = input(
+            "Enter the path to the item database (Example: C:\dump\itemdb\items.bin or items.json):\t")
+        item_db_file_path = item_db_file_path.replace('"', '').replace("'", "")
+        assert os.path.exists(item_db_file_path), "File not found at:\t" + str(item_db_file_path)
     transaction_db_path = input(
         "Enter the directory to store the transaction database (Example: C:\dump\\transactiondb):\t")
     transaction_db_path = transaction_db_path.replace('"', '').replace("'", "")
     assert os.path.exists(transaction_db_path), "File not found at:\t" + str(transaction_db_path)
-    # get filelist of provided path
-    file_list = next(os.walk(input_path))[2]
-    file_list_fullpath = []
-    for file in file_list:
-        file_list_fullpath.append(os.path.join(input_path, file))
-    create_horizontal_database(file_list_fullpath, item_db_file_path, transaction_db_path)
+    # get filelist of provided path, in the order of the manifest if there is one
+    file_list_fullpath = shards.list_shards(input_path)
+    if fused:
+        create_fused_databases(file_list_fullpath, item_db_file_path, ext_ident_path, transaction_db_path)
+    else:
+        parallel = input("Do you want to process the shards in parallel? (y/n):\t")
+        if parallel.upper() == 'Y':
+            processes = input("Enter the number of worker processes (Example: 64, leave empty to use all cores):\t")
+            processes = int(processes) if processes.strip() else None
+            create_horizontal_database_parallel(file_list_fullpath, item_db_file_path, transaction_db_path, processes)
+        else:
+            create_horizontal_database(file_list_fullpath, item_db_file_path, transaction_db_path)
@@ -1,36 +1,302 @@
+import io
 import json
 import os
+from array import array
+from itertools import islice
+from multiprocessing import Pool
 
+import numpy as np
 
-def find_items(pattern_file, transaction_db, tid_db, supporting_items_dir):
+import supportingItems
+
+# the byte ranges of the parallel mode: number of ranges per process and size of the read buffers
+ranges_per_process = 4
+buffer_size = 1 << 24
+
+# the patterns of a worker process and their items
+worker_keys = None
+worker_items = None
+
+
+def read_patterns(pattern_file):
     """
-    For all patterns found with frequent itemset mining, their respecting items which support them are found and stored.
+    Reads the patterns found with frequent itemset mining as sets, without their support count.
     :param pattern_file: output file from frequent itemset mining containing all metadata patterns
-    :param transaction_db: the transaction database
-    :param tid_db: the Wikidata item names for the transaction database
-    :param supporting_items_dir: the directory to store the results
-    :return:
+    :return: list of the distinct patterns as frozensets in the order of the file
     """
     patterns = open(file=pattern_file, mode='r')
     print("Converting Dist-Eclat patterns to sets, not containing the support count.")
     d_patterns = dict()
     for pattern in patterns:
         d_patterns[frozenset(set(pattern.split()[:-1]))] = []
+    patterns.close()
     print("Finished converting Dist-Eclat patterns.")
+    return list(d_patterns)
+
+
+def index_transactions(transactions, pattern_items, first_row=0):
+    """
+    Builds the inverted index of the transaction database in one pass: for every item of the patterns the sorted
+    line numbers of the transactions containing it.
+    :param transactions: iterable of the lines of the transaction database
+    :param pattern_items: set of the items which occur in the patterns
+    :param first_row: line number of the first transaction
+    :return: tuple of (dict of item -> array of line numbers, number of transactions)
+    """
+    index = {item: array('I') for item in pattern_items}
+    row = first_row
+    for transaction in transactions:
+        for item in transaction[:-1].split():
+            tidlist = index.get(item)
+            if tidlist is not None:
+                tidlist.append(row)
+        row += 1
+    return index, row - first_row
+
+
+def supporting_rows(key, index, transaction_count):
+    """
+    Intersects the tid-lists of the items of a pattern, starting with the shortest.
+    :param key: the pattern as frozenset of items
+    :param index: dict of item -> sorted array of line numbers
+    :param transaction_count: number of transactions
+    :return: sorted array of the line numbers of the transactions containing the pattern
+    """
+    if len(key) == 0:
+        return np.arange(transaction_count, dtype=np.uint32)
+    tidlists = sorted((index[item] for item in key), key=len)
+    rows = np.frombuffer(tidlists[0], dtype=np.uint32)
+    for tidlist in tidlists[1:]:
+        if len(rows) == 0:
+            break
+        rows = np.intersect1d(rows, np.frombuffer(tidlist, dtype=np.uint32), assume_unique=True)
+    return rows
+
+
+def read_tids(tid_db, rows):
+    """
+    Reads the Wikidata item names of some lines of tid.txt in one pass.
+    :param tid_db: the Wikidata item names for the transaction database
+    :param rows: sorted array of distinct line numbers
+    :return: tuple of (list of the names of the rows which exist in tid.txt, number of lines of tid.txt)
+    """
+    names = []
+    next_index = 0
+    line_counter = 0
+    with open(file=tid_db, mode='r') as tids:
+        for line_counter, tid in enumerate(tids, 1):
+            if next_index < len(rows) and rows[next_index] == line_counter - 1:
+                names.append(tid[:-1])
+                next_index += 1
+    return names, line_counter
+
+
+def find_items(pattern_file, transaction_db, tid_db, supporting_items_dir, processes=1, compact=False):
+    """
+    For all patterns found with frequent itemset mining, their respecting items which support them are found and stored.
+    An inverted index from the items to their transactions is built in one pass over the transaction database, the
+    supporting transactions of a pattern are the intersection of the tid-lists of its items.
+    :param pattern_file: output file from frequent itemset mining containing all metadata patterns
+    :param transaction_db: the transaction database
+    :param tid_db: the Wikidata item names for the transaction database
+    :param supporting_items_dir: the directory to store the results
+    :param processes: number of worker processes, all cores if None, 1 processes the files in this process
+    :param compact: write supportingItemsPerPattern.jsonl instead of supportingItemsPerPattern.json
+    :return:
+    """
+    keys = read_patterns(pattern_file)
     print("Starting to find TIDs which are supporting the patterns")
-    transactions = open(file=transaction_db, mode='r')
-    tids = open(file=tid_db, mode='r')
-    line_counter = 1
-    for tid, transaction in zip(tids, transactions):
-        tid = tid[:-1]
-        transaction = transaction[:-1].split()
-        for key in d_patterns:
-            if key.issubset(set(transaction)):
-                d_patterns.get(key).append(tid)
-        line_counter += 1
+    if processes != 1:
+        export_patterns(keys, find_items_parallel(keys, transaction_db, tid_db, processes), supporting_items_dir,
+                        compact)
+        return
+    pattern_items = set().union(*keys)
+    with open(file=transaction_db, mode='r') as transactions:
+        index, transaction_count = index_transactions(transactions, pattern_items)
+    print("Indexed transactions:\t", transaction_count)
+    export_tids(keys, [supporting_rows(key, index, transaction_count) for key in keys], tid_db, supporting_items_dir,
+                compact)
+
+
+def export_tids(keys, pattern_rows, tid_db, supporting_items_dir, compact=False):
+    """
+    Replaces the line numbers of the supporting transactions with the Wikidata item names and exports the patterns.
+    Like zip, only the lines which exist in both the transaction database and tid.txt count.
+    :param keys: the patterns as frozensets
+    :param pattern_rows: for every pattern the sorted array of the line numbers of its supporting transactions
+    :param tid_db: the Wikidata item names for the transaction database
+    :param supporting_items_dir: the directory to store the results
+    :param compact: write supportingItemsPerPattern.jsonl instead of supportingItemsPerPattern.json
+    :return:
+    """
+    rows = np.unique(np.concatenate(pattern_rows)) if len(pattern_rows) != 0 else np.zeros(0, dtype=np.uint32)
+    names, tid_count = read_tids(tid_db, rows)
+    rows = rows[:len(names)]
+    # the items of a pattern are only looked up when it is exported
+    pattern_names = ([names[position] for position in np.searchsorted(rows, supporting[supporting < tid_count])] for
+                     supporting in pattern_rows)
+    export_patterns(keys, pattern_names, supporting_items_dir, compact)
+
+
+def line_ranges(path, parts):
+    """
+    Splits a file into byte ranges of about the same size, which start at the beginning of a line.
+    :param path: the file
+    :param parts: number of ranges
+    :return: list of (start, end) byte offsets
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as file:
+        for part in range(1, parts):
+            # a line starting exactly at the offset belongs to this range
+            file.seek(max(size * part // parts - 1, 0))
+            file.readline()
+            if starts[-1] < file.tell() < size:
+                starts.append(file.tell())
+    return [(start, end) for start, end in zip(starts, starts[1:] + [size]) if start < end]
+
+
+def count_lines(path, start, end):
+    """
+    Counts the lines of a byte range of a file, a last line without line break included.
+    :param path: the file
+    :param start: byte offset of the range
+    :param end: byte offset after the range
+    :return: number of lines
+    """
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while start < end:
+            buffer = file.read(min(buffer_size, end - start))
+            if len(buffer) == 0:
+                break
+            lines += buffer.count(b'\n')
+            last = buffer[-1:]
+            start += len(buffer)
+    return lines + (last != b'\n')
+
+
+def line_offsets(path, line_numbers):
+    """
+    Finds the byte offsets of the beginning of some lines of a file in one pass.
+    :param path: the file
+    :param line_numbers: ascending line numbers
+    :return: list of the byte offsets, None for lines after the end of the file
+    """
+    size = os.path.getsize(path)
+    offsets = [None] * len(line_numbers)
+    pending = 0
+    while pending < len(line_numbers) and line_numbers[pending] == 0:
+        offsets[pending] = 0 if size != 0 else None
+        pending += 1
+    # number of line breaks before the buffer
+    line = 0
+    buffer_start = 0
+    with open(path, 'rb') as file:
+        while pending < len(line_numbers):
+            buffer = file.read(buffer_size)
+            if len(buffer) == 0:
+                break
+            breaks = np.flatnonzero(np.frombuffer(buffer, dtype=np.uint8) == ord('\n'))
+            while pending < len(line_numbers) and line_numbers[pending] <= line + len(breaks):
+                offset = buffer_start + int(breaks[line_numbers[pending] - line - 1]) + 1
+                offsets[pending] = offset if offset < size else None
+                pending += 1
+            line += len(breaks)
+            buffer_start += len(buffer)
+    return offsets
+
+
+def init_worker(keys):
+    """
+    Passes the patterns to a worker process once.
+    :param keys: the patterns as frozensets
+    :return:
+    """
+    global worker_keys, worker_items
+    worker_keys = keys
+    worker_items = set().union(*keys)
+
+
+def match_range(transaction_db, start, end, tid_db, tid_start, transaction_count):
+    """
+    Finds the supporting items of all patterns within a byte range of the transaction database and the aligned byte
+    range of tid.txt, which starts at the same line.
+    :param transaction_db: the transaction database
+    :param start: byte offset of the range of the transaction database
+    :param end: byte offset after the range of the transaction database
+    :param tid_db: the Wikidata item names for the transaction database
+    :param tid_start: byte offset of the aligned range of tid.txt, None if tid.txt ends before
+    :param transaction_count: number of lines of the range of the transaction database
+    :return: for every pattern the list of the supporting Wikidata items in the range
+    """
+    with open(transaction_db, 'rb') as file:
+        file.seek(start)
+        transactions = io.TextIOWrapper(io.BytesIO(file.read(end - start)))
+        index, count = index_transactions(transactions, worker_items)
+    if count != transaction_count:
+        raise ValueError('Lines of ' + str(transaction_db) + ' are not separated by line breaks')
+    names = []
+    if tid_start is not None:
+        with open(tid_db, 'rb') as file:
+            file.seek(tid_start)
+            names = [tid[:-1] for tid in islice(io.TextIOWrapper(file), transaction_count)]
+    pattern_names = []
+    for key in worker_keys:
+        supporting = supporting_rows(key, index, count)
+        pattern_names.append([names[row] for row in supporting[supporting < len(names)]])
+    return pattern_names
+
+
+def find_items_parallel(keys, transaction_db, tid_db, processes=None):
+    """
+    Splits the transaction database into byte ranges and tid.txt into aligned byte ranges starting at the same lines,
+    and finds the supporting items of the patterns in every range in a worker process. The lists of the ranges are
+    merged in the order of the transactions.
+    :param keys: the patterns as frozensets
+    :param transaction_db: the transaction database
+    :param tid_db: the Wikidata item names for the transaction database
+    :param processes: number of worker processes, all cores if None
+    :return: for every pattern the list of the supporting Wikidata items
+    """
+    pattern_names = [[] for _ in keys]
+    with Pool(processes, initializer=init_worker, initargs=(keys,)) as pool:
+        # more ranges than processes balance the load
+        ranges = line_ranges(transaction_db, ranges_per_process * (processes or os.cpu_count()))
+        counts = pool.starmap(count_lines, [(transaction_db, start, end) for start, end in ranges])
+        first_lines = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64).tolist()
+        tid_starts = line_offsets(tid_db, first_lines)
+        print("Transaction ranges:\t", len(ranges), "\ttransactions:\t", sum(counts))
+        tasks = [(transaction_db, start, end, tid_db, tid_start, count) for (start, end), tid_start, count in
+                 zip(ranges, tid_starts, counts)]
+        for range_names in pool.starmap(match_range, tasks, chunksize=1):
+            for names, more_names in zip(pattern_names, range_names):
+                names.extend(more_names)
+    return pattern_names
+
+
+def export_patterns(keys, pattern_names, supporting_items_dir, compact=False):
+    """
+    Exports the supporting items of the patterns, keyed by the sorted items of the pattern and the number of
+    supporting items.
+    :param keys: the patterns as frozensets
+    :param pattern_names: iterable of the lists of the supporting Wikidata items of every pattern
+    :param supporting_items_dir: the directory to store the results
+    :param compact: stream the patterns into supportingItemsPerPattern.jsonl instead of supportingItemsPerPattern.json
+    :return:
+    """
+    if compact:
+        writer = supportingItems.SupportingItemsWriter(supporting_items_dir + "\\" + supportingItems.jsonl_name)
+        for key, names in zip(keys, pattern_names):
+            writer.write(' '.join(sorted(key)) + " (" + str(len(names)) + ")", names)
+        writer.close()
+        return
     d_export = dict()
-    for key in d_patterns:
-        d_export[' '.join(sorted(key)) + " (" + str(len(d_patterns.get(key))) + ")"] = d_patterns.get(key)
+    for key, names in zip(keys, pattern_names):
+        d_export[' '.join(sorted(key)) + " (" + str(len(names)) + ")"] = names
     export(d_export, supporting_items_dir)
 
 
@@ -63,4 +329,12 @@ if __name__ == '__main__':
         "Enter the output directory for supportingItemsPerPattern.json (Example: C:\dump\\analysis):\t")
     supporting_items_dir = supporting_items_dir.replace('"', '').replace("'", "")
     assert os.path.exists(supporting_items_dir), "File not found at:\t" + str(supporting_items_dir)
-    find_items(dist_eclat_out, transaction_dat_file, tid_file, supporting_items_dir)
+    compact = input("Do you want to write the compact supportingItemsPerPattern.jsonl instead of the .json? (y/n):\t")
+    compact = compact.upper() == 'Y'
+    parallel = input("Do you want to scan the transaction database in parallel? (y/n):\t")
+    if parallel.upper() == 'Y':
+        processes = input("Enter the number of worker processes (Example: 64, leave empty to use all cores):\t")
+        processes = int(processes) if processes.strip() else None
+        find_items(dist_eclat_out, transaction_dat_file, tid_file, supporting_items_dir, processes, compact)
+    else:
+        find_items(dist_eclat_out, transaction_dat_file, tid_file, supporting_items_dir, compact=compact)
@@ -1,110 +1,89 @@
 import json
 import logging
 import os.path
-import re
 
-import pandas as pd
-from SPARQLWrapper import SPARQLWrapper, JSON
+import classCache
+import classIndex
+import sparqlClient
+import supportingItems
 
-re_wd = re.compile('http:\/\/www\.wikidata\.org\/entity\/')
 
-
-def chunks(wd_items_list, n):
-    """
-    Splitting a list into chunks.
-    :param wd_items_list: List to split into chunks
-    :param n: chunk size
-    :return: a tuple of list chunks
+def perform_query(wd_items, output_suffix, class_memberships_dir, client, class_cache=None):
     """
-    n = max(1, n)
-    return (wd_items_list[i:i + n] for i in range(0, len(wd_items_list), n))
-
-
-# noinspection SqlDialectInspection,SqlNoDataSourceInspection
-def perform_query(items, output_suffix, class_memberships_dir):
-    """
-    Performs a sparql query to the Wikidata endpoint
-    :param items: the items to be queried
+    Queries the class memberships of the supporting items of a pattern from the SPARQL endpoint.
+    :param wd_items: list of the supporting Wikidata items
     :param output_suffix: the filename of the respective patterns
     :param class_memberships_dir: the ouput directory to store the class memberships of the supporting items per pattern
+    :param client: the sparqlClient.SparqlClient, which sends the batches of the items concurrently
+    :param class_cache: optional classCache.ClassCache, only the items which are not cached are queried
     :return:
     """
     logging.debug('"perform_query"-method')
-    endpoint_url = 'https://query.wikidata.org/sparql'
-    logging.debug('Setting SPARQL endpoint to "%s"', endpoint_url)
-    sparql = SPARQLWrapper(endpoint_url,
-                           agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36')
-    sparql.setReturnFormat(JSON)
-    logging.debug('Receiving wd_items to construct the query')
-    wd_items = items
-    l_wd_item_class_iri = list()
-    l_wd_items_iri = list()
-    for chunk in chunks(wd_items.split(), 300):
-        logging.debug('SPARQL-Chunk (Len:\t%s)', len(chunk))
-        sparql.setQuery('''
-                SELECT ?item ?o
-                    WHERE
-                    {
-                        VALUES ?item {''' + ' '.join(chunk) + '''} # use all values in brackets for variable ?item
-                        ?item wdt:P31 ?o . # display all objects which are connected via P31 oder P279 from the item
-                    }
-                    ''')
-        logging.debug('Performing query now.')
-        results = sparql.query().convert()
-        logging.debug("Received results!")
-        logging.debug(
-            "Normalizing .json Output to a pandas dataframe and merging output from return chunks to a single list")
-        l_wd_item_class_iri = l_wd_item_class_iri + pd.json_normalize(results['results']['bindings'])[
-            'o.value'].to_list()
-        l_wd_items_iri = l_wd_items_iri + pd.json_normalize(results['results']['bindings'])['item.value'].to_list()
-    logging.debug('Removing IRI from results and constructing new lists')
-    l_wd_items_class = list()
-    l_wd_items = list()
-    for wd_item, wd_item_class in zip(l_wd_items_iri, l_wd_item_class_iri):
-        if len(list(re.findall(re_wd, wd_item))) == 1 and len(list(re.findall(re_wd, wd_item_class))) == 1:
-            l_wd_items.append(wd_item.replace(re.findall(re_wd, wd_item)[0], '').upper())
-            l_wd_items_class.append(wd_item_class.replace(re.findall(re_wd, wd_item_class)[0], '').upper())
-
-    logging.debug('Results of wd_items (Len:\t%s):\t%s', len(l_wd_items), l_wd_items)
-    logging.debug('Result classes of wd_items(Len:\t%s):\t%s', len(l_wd_items_class), l_wd_items_class)
+    cached = dict()
+    if class_cache is not None:
+        cached = class_cache.get_many(wd_items)
+        logging.debug('Cached items:\t%s of %s', len(cached), len(wd_items))
+    query_items = [wd_item for wd_item in wd_items if wd_item not in cached]
+    # every answered batch is cached at once, items without a result are cached with no classes
+    results = client.instances(query_items, class_cache.put_many if class_cache is not None else None)
     logging.debug('Constructing a dictionary for the output of the query')
     d_result = dict()
-    for item, item_class in zip(l_wd_items, l_wd_items_class):
-        if item not in d_result:
-            d_result[item] = []
-            d_result.get(item).append(item_class)
-        else:
-            d_result.get(item).append(item_class)
+    for wd_item in wd_items:
+        classes = cached[wd_item] if wd_item in cached else results.get(wd_item, [])
+        if len(classes) != 0:
+            d_result[wd_item] = classes
     logging.debug('Dumping result to .json file')
-    file = open(class_memberships_dir + '\\' + output_suffix + '.json', 'w')
-    json.dump(d_result, file)
+    with open(class_memberships_dir + '\\' + output_suffix + '.json', 'w') as file:
+        json.dump(d_result, file)
     logging.debug('Finished dumping')
 
 
-def construct_querys(patterns_with_support_file, class_memberships_dir):
+def lookup_memberships(wd_items, output_suffix, class_memberships_dir, class_index):
+    """
+    Looks up the class memberships in the index of item -> P31 classes built from the dump, without querying the
+    Wikidata endpoint. The output has the format of perform_query.
+    :param wd_items: list of the supporting Wikidata items
+    :param output_suffix: the filename of the respective patterns
+    :param class_memberships_dir: the ouput directory to store the class memberships of the supporting items per pattern
+    :param class_index: the classIndex.ClassIndex
+    :return:
+    """
+    d_result = class_index.memberships(wd_items)
+    logging.debug('Items with classes in the index:\t%s of %s', len(d_result), len(wd_items))
+    with open(class_memberships_dir + '\\' + output_suffix + '.json', 'w') as file:
+        json.dump(d_result, file)
+
+
+def construct_querys(patterns_with_support_file, class_memberships_dir, class_index_dir=None, class_cache=None,
+                     client=None):
     """
     Constructs sparql querys per patterns for to get all class memberships of their supporting items.
     Needed for the entry into the Wikidata class hierarchy.
-    :param patterns_with_support_file: the file containing the patterns with their supporting Wikidata items
+    :param patterns_with_support_file: the file containing the patterns with their supporting Wikidata items, .json or
+     .jsonl
     :param class_memberships_dir: the ouput directory to store the class memberships of the supporting items per pattern
+    :param class_index_dir: the directory of the index of item -> P31 classes built by getP31Objects or
+     cleanAndSplitDump, the Wikidata endpoint is queried if None
+    :param class_cache: optional classCache.ClassCache of the classes of the items queried before, shared with analysis
+    :param client: the sparqlClient.SparqlClient, one for the Wikidata endpoint if None
     :return:
     """
     logging.info('"construct_querys"-method')
-    logging.info('Reading .json pattern file with supporting wd-items.')
-    patterns = open(patterns_with_support_file, 'r')
-    logging.info('Deserializing into python dictionary')
-    d_patterns = json.load(patterns)
-    for key in d_patterns:
+    class_index = classIndex.ClassIndex(class_index_dir) if class_index_dir is not None else None
+    if class_index is None and client is None:
+        client = sparqlClient.SparqlClient()
+    logging.info('Reading pattern file with supporting wd-items.')
+    # the patterns of a .jsonl file are read one at a time
+    for key, wd_items in supportingItems.read_supporting_items(patterns_with_support_file):
         logging.info("Pattern:\t%s", key)
         if not os.path.isfile(class_memberships_dir + "\\" + '_'.join(key.split()) + '.json'):
             logging.debug('Pattern support %s > 2000', key.split()[-1][1:-1])
-            logging.debug('Constructing SPARQL Query now!')
-            wd_items = d_patterns.get(key)
-            wd_items = ['wd:{0}'.format(element) for element in wd_items]
-            query_items = ' '.join(wd_items)
+            if class_index is not None:
+                lookup_memberships(wd_items, '_'.join(key.split()), class_memberships_dir, class_index)
+                continue
             logging.debug('Pattern:\t%s', '_'.join(key.split()))
             logging.debug('Calling "perform_query"-method')
-            perform_query(query_items, '_'.join(key.split()), class_memberships_dir)
+            perform_query(wd_items, '_'.join(key.split()), class_memberships_dir, client, class_cache)
     logging.info("Finished program!")
 
 
@@ -115,10 +94,39 @@ if __name__ == '__main__':
     logging.basicConfig(format='%(levelname)s:\t\t%(message)s', level=logging.INFO)
     logging.info('Starting program!')
     supporting_items_file = input(
-        "Enter the path of supportingItemsPerPattern.json file (Example: C:\dump\\analysis\supportingItemsPerPattern.json):\t")
+        "Enter the path of supportingItemsPerPattern.json or .jsonl file (Example: C:\dump\\analysis\supportingItemsPerPattern.json):\t")
     supporting_items_file = supporting_items_file.replace('"', '').replace("'", "")
     assert os.path.exists(supporting_items_file), "Path not found at:\t" + str(supporting_items_file)
     class_memberships_dir = input("Enter the path of output dir (Example: C:\dump\\analysis\class_memberships):\t")
     class_memberships_dir = class_memberships_dir.replace('"', '').replace("'", "")
     assert os.path.exists(class_memberships_dir), "Path not found at:\t" + str(class_memberships_dir)
-    construct_querys(supporting_items_file, class_memberships_dir)
+    class_index_dir = input("Enter the path of the dir with the index of the P31 classes of all items (Example: "
+                            "C:\dump\\analysis\class_hierarchy, leave empty to query the Wikidata endpoint):\t")
+    class_index_dir = class_index_dir.replace('"', '').replace("'", "").strip() or None
+    if class_index_dir is not None:
+        assert os.path.exists(os.path.join(class_index_dir, classIndex.items_name)), \
+            "Class index not found at:\t" + str(class_index_dir)
+    class_cache = None
+    if class_index_dir is None:
+        class_cache_file = input("Enter the path of the class cache shared with analysis (Example: "
+                                 "C:\dump\\analysis\class_cache.sqlite, leave empty to not cache the classes):\t")
+        class_cache_file = class_cache_file.replace('"', '').replace("'", "").strip()
+        if class_cache_file:
+            assert os.path.exists(os.path.dirname(class_cache_file) or '.'), "Path not found at:\t" + str(
+                os.path.dirname(class_cache_file))
+            snapshot = input("Enter the snapshot tag of the cached classes (Example: the date of the run 20220214):\t")
+            class_cache = classCache.ClassCache(class_cache_file, snapshot.strip())
+    client = None
+    if class_index_dir is None:
+        endpoint = input("Enter the SPARQL endpoint (Example: http://localhost:9999/sparql, leave empty for " +
+                         sparqlClient.endpoint_url + "):\t")
+        concurrency = input("Enter the number of concurrent requests (Example: 4, leave empty for " +
+                            str(sparqlClient.concurrency) + "):\t")
+        client = sparqlClient.SparqlClient(endpoint.strip() or sparqlClient.endpoint_url,
+                                           int(concurrency) if concurrency.strip() else sparqlClient.concurrency)
+    construct_querys(supporting_items_file, class_memberships_dir, class_index_dir, class_cache, client)
+    if client is not None:
+        logging.info('Made %s SPARQL Requests!', client.requests)
+        client.close()
+    if class_cache is not None:
+        class_cache.close()
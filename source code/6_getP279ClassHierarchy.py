@@ -1,41 +1,34 @@
-import bz2
-import json
 import os
-import re
 
+import ancestorIndex
+import classHierarchy
+import parallelBz2
 
-def get_class_hierarchy(dump_file, P279_class_hierarchy_file):
+
+def get_class_hierarchy(dump_file, P279_class_hierarchy_file, processes=None, ancestor_index=False):
     """
     Extracts the complete P279 class hierarchy from the Wikidata dump.
     Is used to find a common superclass of metadata patterns.
     :param dump_file: the file to the .nt.bz2 dump
     :param P279_class_hierarchy_file: the output file for the P279 class hierarchy
+    :param processes: number of processes decompressing the dump, all cores if None
+    :param ancestor_index: build the index of the ancestors of every class with their minimum distance for analysis
     :return:
     """
-    re_class_line = re.compile(
-        '^<http:\/\/www\.wikidata\.org\/entity\/[Qq][^>]+> <http:\/\/www\.wikidata\.org\/prop\/direct\/[Pp]279> <http:\/\/www\.wikidata\.org\/entity\/[^>]+> \.')
-    re_instance = re.compile('(?<=^<http:\/\/www\.wikidata\.org\/entity\/)[Qq]([^>]+)')
-    re_superclass = re.compile('(?<=<http:\/\/www\.wikidata\.org\/entity\/)[Qq]([^>]+)> \.$')
     hierarchy = dict()
-    stream = bz2.open(dump_file, 'rt')
+    stream = parallelBz2.read_lines(dump_file, processes)
     counter = 0
-    out_file = open(P279_class_hierarchy_file, 'w')
     for line in stream:
         counter += 1
         if counter % 10000000 == 0 and counter != 0:
             print("Processed 10 Million lines.")
             print("Class-counts:\t", len(hierarchy.keys()))
-        if len(re.findall(re_class_line, line)) == 1:
-            instance = (re.findall(re_instance, line)[0])
-            superclass = (re.findall(re_superclass, line)[0])
-            if instance not in hierarchy:
-                hierarchy[instance] = list()
-                hierarchy[instance].append(superclass)
-            else:
-                hierarchy[instance].append(superclass)
-
-    json.dump(hierarchy, out_file)
-    out_file.close()
+        classHierarchy.add_P279_line(line, hierarchy)
+    classHierarchy.write_P279_hierarchy(hierarchy, P279_class_hierarchy_file)
+    if ancestor_index:
+        class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
+        offsets, superclasses = classHierarchy.load_P279_arrays(class_hierarchy_dir)
+        ancestorIndex.write_ancestor_index(offsets, superclasses, class_hierarchy_dir)
     print("Finished!")
 
 
@@ -51,4 +44,7 @@ if __name__ == '__main__':
     P279_class_hierarchy_file = P279_class_hierarchy_file.replace('"', '').replace("'", "")
     class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
     assert os.path.exists(class_hierarchy_dir), "Path not found at:\t" + str(class_hierarchy_dir)
-    get_class_hierarchy(dump_file, P279_class_hierarchy_file)
+    processes = input("Enter the number of decompression processes (Example: 8, leave empty to use all cores):\t")
+    processes = int(processes) if processes.strip() else None
+    ancestor_index = input("Do you want to build the index of the ancestors of the classes for analysis? (y/n):\t")
+    get_class_hierarchy(dump_file, P279_class_hierarchy_file, processes, ancestor_index.upper() == 'Y')
@@ -1,35 +1,35 @@
-import bz2
-import json
 import os
-import re
 
+import classHierarchy
+import classIndex
+import parallelBz2
 
-def get_class_hierarchy(dump_file, P31_class_hierarchy_file):
+
+def get_class_hierarchy(dump_file, P31_class_hierarchy_file, processes=None, class_index_dir=None):
     """
     Extracts the complete P31 objects class hierarchy from the Wikidata dump.
     Is used to find a common superclass of metadata patterns.
     :param dump_file: the file to the .nt.bz2 dump
     :param P31_class_hierarchy_file: the output file for the P31 objects class hierarchy
+    :param processes: number of processes decompressing the dump, all cores if None
+    :param class_index_dir: the directory of the index of item -> P31 classes, which is built in the same scan, not
+    built if None
     :return:
     """
-    re_instance_line = re.compile(
-        '^<http:\/\/www\.wikidata\.org\/entity\/[Qq][^>]+> <http:\/\/www\.wikidata\.org\/prop\/direct\/[Pp]31> <http:\/\/www\.wikidata\.org\/entity\/[^>]+> \.')
-    re_superclass = re.compile('(?<=<http:\/\/www\.wikidata\.org\/entity\/)[Qq]([^>]+)> \.$')
-    stream = bz2.open(dump_file, 'rt')
+    stream = parallelBz2.read_lines(dump_file, processes)
     counter = 0
-    out_file = open(P31_class_hierarchy_file, 'w')
     all_p31_objects = set()
+    class_index = classIndex.ClassIndexWriter(class_index_dir) if class_index_dir is not None else None
     for line in stream:
         counter += 1
         if counter % 10000000 == 0 and counter != 0:
             print("Processed 10 Million lines.")
             print("Distinct Class-objects:\t", len(all_p31_objects))
-        if len(re.findall(re_instance_line, line)) == 1:
-            class_object = int((re.findall(re_superclass, line)[0]))
-            all_p31_objects.add(class_object)
-    l_all_p31_objects = sorted(list(all_p31_objects))
-    json.dump(l_all_p31_objects, out_file)
-    out_file.close()
+        classHierarchy.add_P31_line(line, all_p31_objects, class_index)
+    classHierarchy.write_P31_objects(all_p31_objects, P31_class_hierarchy_file)
+    if class_index is not None:
+        print("P31 statements in the class index:\t", class_index.count)
+        class_index.close()
     print("Finished!")
 
 
@@ -45,4 +45,9 @@ if __name__ == '__main__':
     P279_class_hierarchy_file = P279_class_hierarchy_file.replace('"', '').replace("'", "")
     class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
     assert os.path.exists(class_hierarchy_dir), "Path not found at:\t" + str(class_hierarchy_dir)
-    get_class_hierarchy(dump_file, P279_class_hierarchy_file)
+    processes = input("Enter the number of decompression processes (Example: 8, leave empty to use all cores):\t")
+    processes = int(processes) if processes.strip() else None
+    build_index = input("Do you want to build the index of the P31 classes of all items next to the P31 class "
+                        "hierarchy for getClassMembership? (y/n):\t")
+    class_index_dir = class_hierarchy_dir if build_index.upper() == 'Y' else None
+    get_class_hierarchy(dump_file, P279_class_hierarchy_file, processes, class_index_dir)
@@ -1,23 +1,29 @@
 import csv
-import itertools
 import json
 import logging
 import os
 import re
-import sys
-import time
-import traceback
 
 import numpy as np
-import pandas as pd
-from SPARQLWrapper import SPARQLWrapper, JSON
+
+import classCache
+import ancestorIndex
+import classHierarchy
+import sparqlClient
 
 re_wd = re.compile('http:\/\/www\.wikidata\.org\/entity\/')
 
 all_results = dict()
 hierarchy = None
-P279_class_hierarchy = None
-P31_class_hierarchy = None
+# the P279 class hierarchy in compressed sparse row form, see classHierarchy.P279_arrays
+P279_offsets = None
+P279_superclasses = None
+# the ancestorIndex.AncestorIndex of the P279 class hierarchy
+ancestor_index = None
+# hierarchy level from which on a pattern is checked with the ancestor index before it is expanded further
+index_level = 10
+# the P31 objects as packed bitset, see classHierarchy.P31_bitset
+P31_classes = None
 max_item_class = None
 max_p31_class = None
 skipped_patterns = dict()
@@ -25,6 +31,10 @@ too_new_patterns = dict()
 modeling_errors = dict()
 
 instance_requests = dict()
+# optional classCache.ClassCache in place of instance_requests, which keeps the instances across runs
+instance_cache = None
+# the sparqlClient.SparqlClient of the queries of instances
+sparql_client = sparqlClient.SparqlClient()
 requests = 0
 
 
@@ -110,45 +120,62 @@ def load_current_state(dir):
 
 def load_classes_via_P31(file):
     """
-    Loads the P31 class hierarchy as an array for constant access time and stores it in a global variable.
+    Loads the P31 class hierarchy as packed bitset for constant access time and stores it in a global variable. The
+    bitset written next to the .json file is loaded, otherwise it is built from the .json.
     :param file: the P31 class hierarchy file
     :return:
     """
-    file = open(file, 'r')
-    class_via_instance_of = json.load(file)
-    file.close()
-    logging.info('Loaded %s classes via P31 object relations!', len(class_via_instance_of))
-    global P31_class_hierarchy
-    P31_class_hierarchy = np.array([None for i in range(class_via_instance_of[-1] + 1)])
+    global P31_classes
+    class_hierarchy_dir = os.path.dirname(file)
+    if os.path.exists(os.path.join(class_hierarchy_dir, classHierarchy.P31_bitset_name)):
+        P31_classes = classHierarchy.load_P31_bitset(class_hierarchy_dir)
+    else:
+        file = open(file, 'r')
+        P31_classes = classHierarchy.P31_bitset(json.load(file))
+        file.close()
+    set_bytes = np.flatnonzero(P31_classes)
     global max_p31_class
-    max_p31_class = class_via_instance_of[-1]
-    [np.put(P31_class_hierarchy, c, c) for c in class_via_instance_of]
+    max_p31_class = int(set_bytes[-1]) * 8 + int(P31_classes[set_bytes[-1]]).bit_length() - 1
+    logging.info('Loaded classes via P31 object relations up to class Q%s!', max_p31_class)
     logging.info('Finished array initialization')
 
 
 def load_hierarchy(file):
     """
-    Loads the P279 class hierarchy as an array for constant access time and stores it in a global variable.
+    Loads the P279 class hierarchy in compressed sparse row form for constant access time and stores it in global
+    variables. The arrays written next to the .json file are memory mapped, otherwise they are built from the .json.
     :param file: the P279 class hierarchy file
     :return:
     """
-    file = open(file, 'r')
-    hierarchy_json = json.load(file)
-    keys = list(hierarchy_json.keys())
-    value_lists = list(hierarchy_json.values())
-    hierarchy = {int(key): [int(value) for value in value_list] for key, value_list in zip(keys, value_lists)}
-    int_keys = hierarchy.keys()
-    int_value_lists = hierarchy.values()
-    sorted_hierarchy_tuples = sorted(zip(int_keys, int_value_lists))
-    hierarchy_sorted = {sorted_tuples[0]: sorted_tuples[1] for sorted_tuples in sorted_hierarchy_tuples}
-    hierarchy_array = np.array(list(hierarchy_sorted.items()), dtype='object')
+    global P279_offsets
+    global P279_superclasses
+    class_hierarchy_dir = os.path.dirname(file)
+    if os.path.exists(os.path.join(class_hierarchy_dir, classHierarchy.P279_offsets_name)):
+        logging.info('Memory mapping the P279 class hierarchy arrays')
+        # plain arrays on the same pages, which index faster than the numpy.memmap subclass
+        P279_offsets, P279_superclasses = (np.asarray(array) for array in
+                                           classHierarchy.load_P279_arrays(class_hierarchy_dir))
+    else:
+        file = open(file, 'r')
+        P279_offsets, P279_superclasses = classHierarchy.P279_arrays(json.load(file))
+        file.close()
     global max_item_class
-    max_item_class = hierarchy_array[-1][0]
-    global P279_class_hierarchy
-    P279_class_hierarchy = np.array(
-        [hierarchy_sorted[i] if i in hierarchy_sorted.keys() else None for i in range(hierarchy_array[-1][0])],
-        dtype="object")
-    logging.info("Generated sorted hierarchy with length:\t%s", int(hierarchy_array.size / 2))
+    max_item_class = len(P279_offsets) - 2
+    global ancestor_index
+    ancestor_index = ancestorIndex.AncestorIndex(P279_offsets, P279_superclasses, class_hierarchy_dir)
+    if ancestor_index.classes is None:
+        logging.info('No ancestor index found, the ancestors are searched when a class is looked up first')
+    logging.info("Loaded hierarchy up to class Q%s with %s superclass relations", max_item_class,
+                 len(P279_superclasses))
+
+
+def get_P279_superclasses(query_item):
+    """
+    Looks up the superclasses of a class in the P279 class hierarchy.
+    :param query_item: the numeric id of the class, at most max_item_class
+    :return: array of the sorted numeric ids of the superclasses, empty if the class has no superclass
+    """
+    return P279_superclasses[P279_offsets[query_item]:P279_offsets[query_item + 1]]
 
 
 def do_work(file_list, results_dir):
@@ -299,76 +326,216 @@ def evaluate(distinct_classes, dict_class_counts, pattern, supporting_items, res
         modeling_errors[pattern] = modelling_errors_list
         return
     logging.info('Initial pre superclasses:\t%s', level_0_superclasses)
-    hierarchy_levels_merged = dict()
-    for distinct_class in distinct_classes:
-        dict_key = ' '.join(distinct_class)
-        logging.debug('Constructed Key for merged hierarchy:\t%s', dict_key)
-        merged_superclasses = list()
-        for c in distinct_class:
-            merged_superclasses.extend(level_0_superclasses[c])
-        merged_superclasses = sorted(list(set(merged_superclasses)), key=lambda x: int(x[1:]))
-        logging.debug('Merged Superclasses for "%s":\t%s', dict_key, merged_superclasses)
-        hierarchy_levels_merged[dict_key] = merged_superclasses
-    logging.info('Merged hierarchy:\t%s', hierarchy_levels_merged)
-    logging.debug('Constructing the hierarchy-dict now')
-    hierarchy = {key: [hierarchy_levels_merged[key].copy()] for key in hierarchy_levels_merged}
-    logging.debug('Initial Hierarchy:\t%s', hierarchy)
-    logging.debug('Initial Hierarchy values:\t%s', list(hierarchy.values()))
-    logging.debug('Checking for superclasses on initial level')
-    common_superclasses = intersect_classes(hierarchy_levels_merged.values())
-    hierarchy_level = 0
-    while len(common_superclasses) == 0:
-        for key in hierarchy:
-            logging.debug('Getting superclasses for:\t%s', hierarchy[key][hierarchy_level])
-            next_superclasses, too_new, _, _, _ = get_superclasses(hierarchy[key][hierarchy_level])
-            if too_new:
-                too_new_patterns[pattern] = []
-                logging.info(
-                    'At least one class we received is too new. This can only be the case if it is retrieved via SPARQL instance relation.')
-                return
-            next_superclasses = sorted(list(set(itertools.chain(*next_superclasses.values()))),
-                                       key=lambda x: int(x[1:]))
-            hierarchy[key].append(next_superclasses)
-            logging.debug('Merging new superclasses to merged hierarchy')
-            hierarchy_levels_merged[key].extend(next_superclasses)
-            hierarchy_levels_merged[key] = sorted(list(set(hierarchy_levels_merged[key])), key=lambda x: int(x[1:]))
-        hierarchy_level += 1
-        if hierarchy_level == 50:
-            global skipped_patterns
-            skipped_patterns[pattern] = hierarchy_level
-            return
-        logging.debug('Expanded Hierarchy dict:\t%s', hierarchy)
-        logging.debug('Extended merged hierarchy dict:\t%s', hierarchy_levels_merged)
-        logging.info('Increased Hierarchy level to:\t%s', hierarchy_level)
-        logging.debug('Checking for superclasses now')
-        common_superclasses = intersect_classes(hierarchy_levels_merged.values())
+    found = expand_hierarchy(distinct_classes, level_0_superclasses, pattern)
+    if found is None:
+        return
+    levels, common = found
+    hierarchy = {' '.join(distinct_class): [['Q' + str(superclass) for superclass in level.tolist()]
+                                           for level in key_levels]
+                 for distinct_class, key_levels in zip(distinct_classes, levels)}
+    logging.debug('Hierarchy:\t%s', hierarchy)
+    common_superclasses = ['Q' + str(superclass) for superclass in common.tolist()]
     logging.info('Found superclass for pattern:\t%s', pattern)
-    superclass_indices = get_indices(common_superclasses, hierarchy.values())
+    superclass_indices = get_indices(common, levels)
     weights = get_weights(dict_class_counts, superclass_indices)
     construct_result(pattern, hierarchy, weights, superclass_indices, common_superclasses, dict_class_counts)
     write_to_csv(pattern, distinct_classes, weights, common_superclasses, superclass_indices,
                  get_distribution(supporting_items), False, results_dir)
 
 
-def get_indices(intersect_results, hierarchy_values):
+def expand_hierarchy(distinct_classes, level_0_superclasses, pattern):
+    """
+    Builds the relative class hierarchy of the distinct class combinations level by level until they have a common
+    superclass. The levels are expanded for all combinations at once on the numeric ids. A pattern which has no common
+    superclass after index_level levels is checked with the ancestor index first, so too new and skipped patterns do not
+    expand all 50 levels.
+    :param distinct_classes: the distinct class combinations of relative hierarchy level 0
+    :param level_0_superclasses: dictionary with the superclasses of the classes of the combinations
+    :param pattern: the pattern to evaluate
+    :return: tuple of (list with the list of superclass arrays per hierarchy level per distinct class combination,
+    array of the common superclasses), None if the pattern is too new or skipped
+    """
+    global too_new_patterns
+    global skipped_patterns
+    levels = [[np.unique(np.array([int(superclass[1:]) for c in distinct_class for superclass in
+                                   level_0_superclasses[c]], dtype=np.int64))] for distinct_class in distinct_classes]
+    merged = [key_levels[0] for key_levels in levels]
+    common = intersect_classes(merged)
+    hierarchy_level = 0
+    while len(common) == 0:
+        if hierarchy_level == index_level and find_common_superclasses(distinct_classes, pattern) is None:
+            return None
+        current = [key_levels[hierarchy_level] for key_levels in levels]
+        if any(np.any(classes > max_item_class) for classes in current):
+            logging.info('At least one class we received is too new. This can only be the case if it is retrieved '
+                         'via SPARQL instance relation.')
+            too_new_patterns[pattern] = []
+            return None
+        for key_index, superclasses in enumerate(next_superclasses(current)):
+            levels[key_index].append(superclasses)
+            merged[key_index] = np.union1d(merged[key_index], superclasses)
+        hierarchy_level += 1
+        if hierarchy_level == 50:
+            skipped_patterns[pattern] = hierarchy_level
+            return None
+        logging.debug('Increased Hierarchy level to:\t%s', hierarchy_level)
+        common = intersect_classes(merged)
+    return levels, common
+
+
+def intersect_classes(superclass_list):
+    """
+    Intersects the superclasses of the distinct class combinations to find a common superclass.
+    :param superclass_list: list with the sorted array of the numeric ids of the superclasses per distinct class
+    combination
+    :return: sorted array of the common superclasses
+    """
+    common = superclass_list[0]
+    for superclasses in superclass_list[1:]:
+        common = np.intersect1d(common, superclasses, assume_unique=True)
+    return common
+
+
+def merge_distances(ancestors, distances, new_ancestors, new_distances):
+    """
+    Merges ancestors with their distance, keeping the minimum distance of every ancestor.
+    :param ancestors: sorted array of the numeric ids of the ancestors
+    :param distances: array of their distances
+    :param new_ancestors: array of the numeric ids of the added ancestors
+    :param new_distances: array of their distances
+    :return: tuple of (ancestors, distances) arrays sorted by ancestor, without distances beyond the ancestor index
+    """
+    merged_ancestors = np.concatenate((ancestors, new_ancestors))
+    merged_distances = np.concatenate((distances, new_distances))
+    inside = merged_distances <= ancestorIndex.max_distance
+    merged_ancestors, merged_distances = merged_ancestors[inside], merged_distances[inside]
+    order = np.lexsort((merged_distances, merged_ancestors))
+    merged_ancestors, merged_distances = merged_ancestors[order], merged_distances[order]
+    first = np.ones(len(merged_ancestors), dtype=bool)
+    first[1:] = merged_ancestors[1:] != merged_ancestors[:-1]
+    return merged_ancestors[first], merged_distances[first]
+
+
+def find_common_superclasses(distinct_classes, pattern):
+    """
+    Finds the hierarchy level of the common superclasses of the distinct class combinations with the ancestor index.
+    The relative class hierarchy of a combination holds at level i the classes with a path of i + 1 superclass
+    relations from one of its classes, so the minimum distances are collected: the ancestors of the classes are looked
+    up in the index, and classes without superclass continue via SPARQL with their instances. The ancestors only change
+    on the distances of these classes and of too new classes, so the levels in between are checked at once. Too new
+    classes and the limit of 50 levels are handled like in the relative class hierarchy.
+    :param distinct_classes: the distinct class combinations of relative hierarchy level 0
+    :param pattern: the pattern to evaluate
+    :return: the hierarchy level of the common superclasses, None if the pattern is too new or skipped
+    """
+    global too_new_patterns
+    global skipped_patterns
+    empty = np.zeros(0, dtype=np.int64)
+    key_ancestors = [(empty, empty) for _ in distinct_classes]
+    # per combination and distance the classes whose ancestors are added
+    starts = [{0: [int(c[1:]) for c in distinct_class]} for distinct_class in distinct_classes]
+    distance = 0
+    while True:
+        if distance == 0:
+            current = [np.unique(np.array(key_starts[0], dtype=np.int64)) for key_starts in starts]
+        else:
+            current = [ancestors[distances == distance] for ancestors, distances in key_ancestors]
+            if any(np.any(classes > max_item_class) for classes in current):
+                logging.info('At least one class we received is too new. This can only be the case if it is '
+                             'retrieved via SPARQL instance relation.')
+                too_new_patterns[pattern] = []
+                return None
+        if distance == 50:
+            skipped_patterns[pattern] = distance
+            return None
+        for key_index, key_starts in enumerate(starts):
+            parts = [ancestor_index.get(start) for start in key_starts.pop(distance, [])]
+            if parts:
+                key_ancestors[key_index] = merge_distances(
+                    *key_ancestors[key_index], np.concatenate([part[0] for part in parts]).astype(np.int64),
+                    np.concatenate([part[1] for part in parts]).astype(np.int64) + distance)
+        sinks = [classes[P279_offsets[classes + 1] == P279_offsets[classes]] for classes in current]
+        if any(len(classes) != 0 for classes in sinks):
+            instances = search_for_instances(
+                list(dict.fromkeys('Q' + str(sink) for classes in sinks for sink in classes.tolist())))
+            for key_index, classes in enumerate(sinks):
+                found = np.unique(np.array([int(instance[1:]) for sink in classes.tolist() for instance in
+                                            instances['Q' + str(sink)]], dtype=np.int64))
+                if len(found) == 0:
+                    continue
+                # only instances which are reached first or on a shorter path continue with their ancestors
+                ancestors, distances = key_ancestors[key_index]
+                closer = found
+                if len(ancestors) != 0:
+                    positions = np.minimum(np.searchsorted(ancestors, found), len(ancestors) - 1)
+                    closer = found[(ancestors[positions] != found) | (distances[positions] > distance + 1)]
+                if len(closer) != 0:
+                    key_ancestors[key_index] = merge_distances(ancestors, distances, closer,
+                                                               np.full(len(closer), distance + 1, dtype=np.int64))
+                    starts[key_index].setdefault(distance + 1, []).extend(closer.tolist())
+        # the next distance with starts, too new classes or classes without superclass
+        next_distance = 50
+        for (ancestors, distances), key_starts in zip(key_ancestors, starts):
+            next_distance = min([next_distance] + list(key_starts))
+            later = distances > distance
+            ancestors, distances = ancestors[later], distances[later]
+            known = ancestors <= max_item_class
+            changing = ~known
+            changing[known] = P279_offsets[ancestors[known] + 1] == P279_offsets[ancestors[known]]
+            if np.any(changing):
+                next_distance = min(next_distance, int(distances[changing].min()))
+        # a superclass is common on the level of its largest distance - 1
+        common = intersect_classes([ancestors for ancestors, _ in key_ancestors])
+        if len(common) != 0:
+            largest = np.max([distances[np.searchsorted(ancestors, common)] for ancestors, distances in key_ancestors],
+                             axis=0)
+            level = max(distance, int(largest.min()) - 1)
+            if level < next_distance:
+                logging.debug('Found superclasses on hierarchy level:\t%s', level)
+                return level
+        distance = next_distance
+
+
+def next_superclasses(classes):
+    """
+    Finds the superclasses of classes, classes without superclass continue via SPARQL with their instances.
+    :param classes: list with an array of the numeric ids of classes per distinct class combination
+    :return: list with the sorted array of the numeric ids of their superclasses per distinct class combination
+    """
+    # too new classes have no superclass, like in get_superclasses
+    classes = [key_classes[key_classes <= max_item_class] for key_classes in classes]
+    sinks = [key_classes[P279_offsets[key_classes + 1] == P279_offsets[key_classes]] for key_classes in classes]
+    instances = dict()
+    if any(len(key_sinks) != 0 for key_sinks in sinks):
+        instances = search_for_instances(
+            list(dict.fromkeys('Q' + str(sink) for key_sinks in sinks for sink in key_sinks.tolist())))
+    superclasses = []
+    for key_classes, key_sinks in zip(classes, sinks):
+        starts = P279_offsets[key_classes]
+        lengths = P279_offsets[key_classes + 1] - starts
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        key_instances = np.array([int(instance[1:]) for sink in key_sinks.tolist() for instance in
+                                  instances['Q' + str(sink)]], dtype=np.int64)
+        superclasses.append(np.unique(np.concatenate((P279_superclasses[positions].astype(np.int64), key_instances))))
+    return superclasses
+
+
+def get_indices(common_superclasses, levels):
     """
     Finds the indice levels of the common superclasses per distinct initial class combination
-    :param intersect_results: list of common superclasses
-    :param hierarchy_values: the relative class hierarchy of a pattern
+    :param common_superclasses: array of the numeric ids of the common superclasses
+    :param levels: list with the list of superclass arrays per hierarchy level per distinct class combination
     :return:
     """
-    logging.debug('Analyzing:\t%s', intersect_results)
-    logging.debug('tGot Hierarchy values:\t%s', hierarchy_values)
-    indices = list()
-    for res in intersect_results:
-        res_indices = list()
-        for class_hierarchy in hierarchy_values:
-            for i in range(0, len(class_hierarchy)):
-                if res in class_hierarchy[i]:
-                    res_indices.append(i)
-                    # leave the class hierarchy at first hit and search in the next hierarchy item
-                    break
-        indices.append(res_indices)
+    logging.debug('Analyzing:\t%s', common_superclasses)
+    key_indices = []
+    for key_levels in levels:
+        # the first level with a superclass is written last
+        indices = np.zeros(len(common_superclasses), dtype=np.int64)
+        for i in range(len(key_levels) - 1, -1, -1):
+            indices[np.isin(common_superclasses, key_levels[i], assume_unique=True)] = i
+        key_indices.append(indices)
+    indices = np.stack(key_indices, axis=1).tolist() if key_indices else []
     logging.debug('Found indices:\t%s', indices)
     return indices
 
@@ -395,40 +562,20 @@ def get_distribution(supporting_items):
     :return: class percentage of the list
     """
     sup = len(supporting_items)
-    global P31_class_hierarchy
     global max_p31_class
     global max_item_class
-    global P279_class_hierarchy
-    is_class = dict()
-    for item in supporting_items:
-        query_item = int(item[1:])
-        # print(fucking_fancy_array[query_item])
-        # if one of the both queries is not None, we have a class! if both are None, we have an Wikidata Item at lowest depth
-        if query_item <= max_p31_class and query_item <= max_item_class and (
-                P279_class_hierarchy[query_item] is not None or P31_class_hierarchy[query_item] is not None):
-            logging.debug('Item %s is a subclass of %s', item, P279_class_hierarchy[query_item])
-            is_class[item] = True
-        else:
-            is_class[item] = False
-    class_count = sum(1 for value in is_class.values() if value)
+    query_items = np.unique(np.array([int(item[1:]) for item in supporting_items], dtype=np.int64))
+    query_items = query_items[(query_items <= max_p31_class) & (query_items <= max_item_class)]
+    # an item with a superclass or which is a P31 object is a class, otherwise it is a Wikidata Item at lowest depth
+    has_superclass = P279_offsets[query_items + 1] > P279_offsets[query_items]
+    is_class = has_superclass | classHierarchy.contains(P31_classes, query_items)
+    class_count = int(np.count_nonzero(is_class))
     logging.info('Class count:\t%s', class_count)
     class_percentage = class_count / sup
     logging.info('Class distribution:\t%s', class_percentage)
     return class_percentage
 
 
-def intersect_classes(superclass_list):
-    """
-    Intersects a list to find a common superclass.
-    :param superclass_list: list of class hierarchy items per initial distinct class combination.
-    :return: intersect result
-    """
-    logging.debug('Merged hierarchy:\t%s', superclass_list)
-    intersect_result = set.intersection(*map(set, superclass_list))
-    logging.debug('Intersect result:\t%s', set.intersection(*map(set, superclass_list)))
-    return list(intersect_result)
-
-
 def get_classes(pattern_path, results_dir):
     """
     Reads the classes of a pattern file and initiates the analysis of it.
@@ -482,7 +629,6 @@ def get_superclasses(items):
     splitted_items = [item.split() for item in items]
     logging.debug('Splitted items:\t%s', splitted_items)
     query_items = [int(item[1:]) for sublist in splitted_items for item in sublist]
-    global P279_class_hierarchy
     global max_item_class
     modelling_error = False
     too_new = False
@@ -493,7 +639,7 @@ def get_superclasses(items):
         if query_item > max_item_class:
             too_new = True
             too_new_list.append(query_item)
-        elif P279_class_hierarchy[query_item] is None:
+        elif len(get_P279_superclasses(query_item)) == 0:
             sparql_query_items.append(query_item)
             logging.debug('Trying to get instance from SPARQL, item Q%s has no superclass!', query_item)
         else:
@@ -502,73 +648,52 @@ def get_superclasses(items):
     modelling_errors_list = list()
     if len(sparql_query_items) > 0:
         logging.debug('Trying to get a instances for items which have no further superclass:\t%s', sparql_query_items)
-        sparql_query_results = {'Q' + str(sparql_item): search_for_instance('Q' + str(sparql_item)) for sparql_item in
-                                sparql_query_items}
+        sparql_query_results = search_for_instances(['Q' + str(sparql_item) for sparql_item in sparql_query_items])
         if [] in sparql_query_results.values():
             logging.error('A item with no superclass and no further instance was found, modelling error!')
             modelling_errors_list = [key for key in sparql_query_results.keys() if sparql_query_results[key] == []]
             modelling_error = True
     logging.debug('Getting hierarchy!')
     d_results = sparql_query_results | {
-        'Q' + str(query_item): ['Q' + str({0}).format(element) for element in sorted(P279_class_hierarchy[query_item])]
+        'Q' + str(query_item): ['Q' + str(element) for element in get_P279_superclasses(query_item).tolist()]
         for query_item in localquery_items}
     logging.debug('Finished getting hierarchy')
     logging.debug('Results:\t%s', d_results)
     return d_results, too_new, modelling_error, modelling_errors_list, too_new_list
 
 
-def search_for_instance(item):
+def search_for_instances(items):
     """
-    Performs a sparql query to find a class via the P31 relation.
+    Performs sparql queries to find classes via the P31 relation, the items which are not known yet are queried in
+    concurrent batches.
     Used only if no further P279 relation can be found.
-    :param item: Wikidata item used in the query
-    :return:
+    :param items: list of Wikidata items used in the queries
+    :return: dictionary with the list of P31 classes per item, empty if an item has none
     """
     global instance_requests
-    if item not in instance_requests:
-        for attempt in range(5):
-            headers = None
-            try:
-                global requests
-                requests += 1
-                logging.info('Getting Superclass via SPARQL with P31 relation for item:\t%s', item)
-                endpoint_url = 'https://query.wikidata.org/sparql'
-                sparql = SPARQLWrapper(endpoint_url,
-                                       agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36 Edg/97.0.1072.69')
-                sparql.setReturnFormat(JSON)
-                ############# x
-                sparql.setQuery('SELECT ?instance  WHERE { wd:' + item + ' wdt:P31 ?instance . }')
-                logging.debug('Performing query now.')
-                query = sparql.query()
-                headers = query.response.headers
-                results = query.convert()
-                logging.debug("Received results!")
-                logging.debug("Normalizing .json Output to a pandas dataframe")
-                instances = []
-                if results['results']['bindings'] != []:
-                    list_results = pd.json_normalize(results['results']['bindings'])['instance.value'].to_list()
-                    re_wd = re.compile('http:\/\/www\.wikidata\.org\/entity\/')
-                    instances = [res.replace(re.findall(re_wd, res)[0], '').upper() for res in list_results]
-                    logging.debug('Removed IRI from results')
-                    instance_requests[item] = instances
-                    return instances
-                else:
-                    instance_requests[item] = instances
-                    return instances
-            except Exception as e:
-                logging.error('Exception:\t%s', traceback.format_exception(*sys.exc_info()))
-                logging.error('Header keys:\t%s', headers.keys())
-                logging.error('Header values:\t%s', headers.values())
-                if 'Retry-After' in headers.keys():
-                    logging.info("Found 'Retry-After' in header:\t%s", headers['Retry-After'])
-                    secs = 60 + int(headers['Retry-After'])
-                    time.sleep(secs)
-                else:
-                    logging.info("Could not find'Retry-After' in header, sleeping 5 minutes")
-                    time.sleep(20)
+    global requests
+    if instance_cache is not None:
+        instance_requests.update(instance_cache.get_many([item for item in items if item not in instance_requests]))
+    query_items = [item for item in items if item not in instance_requests]
+    if len(query_items) > 0:
+        logging.info('Getting Superclass via SPARQL with P31 relation for items:\t%s', query_items)
+        client_requests = sparql_client.requests
+        sparql_client.instances(query_items, store_instances)
+        requests += sparql_client.requests - client_requests
     else:
-        logging.debug('Already found instance!')
-        return instance_requests[item]
+        logging.debug('Already found instances!')
+    return {item: instance_requests[item] for item in items}
+
+
+def store_instances(item_instances):
+    """
+    Keeps the instances found via SPARQL, in the class cache if it is used.
+    :param item_instances: dict of item -> list of its P31 classes
+    :return:
+    """
+    instance_requests.update(item_instances)
+    if instance_cache is not None:
+        instance_cache.put_many(item_instances)
 
 
 def clean_results_directory(dir):
@@ -618,6 +743,20 @@ if __name__ == '__main__':
         "Enter the path of the P31_class_hierarchy (Example: C:\dump\\analysis\class_hierarchy\class_hierarchy_P31.json):\t")
     P31_class_hierarchy_file = P31_class_hierarchy_file.replace('"', '').replace("'", "")
     assert os.path.exists(P31_class_hierarchy_file), "Path not found at:\t" + str(P31_class_hierarchy_file)
+    class_cache_file = input("Enter the path of the class cache shared with getClassMembership (Example: "
+                             "C:\dump\\analysis\class_cache.sqlite, leave empty to not cache the classes):\t")
+    class_cache_file = class_cache_file.replace('"', '').replace("'", "").strip()
+    if class_cache_file:
+        assert os.path.exists(os.path.dirname(class_cache_file) or '.'), "Path not found at:\t" + str(
+            os.path.dirname(class_cache_file))
+        snapshot = input("Enter the snapshot tag of the cached classes (Example: the date of the run 20220214):\t")
+        instance_cache = classCache.ClassCache(class_cache_file, snapshot.strip())
+    endpoint = input("Enter the SPARQL endpoint (Example: http://localhost:9999/sparql, leave empty for " +
+                     sparqlClient.endpoint_url + "):\t")
+    concurrency = input("Enter the number of concurrent requests (Example: 4, leave empty for " +
+                        str(sparqlClient.concurrency) + "):\t")
+    sparql_client = sparqlClient.SparqlClient(endpoint.strip() or sparqlClient.endpoint_url,
+                                              int(concurrency) if concurrency.strip() else sparqlClient.concurrency)
     logging.info('Analysis of patterns started')
     files = get_files(class_memberships_dir)
     logging.info('Files Length:\t%s', len(files))
@@ -628,3 +767,6 @@ if __name__ == '__main__':
     logging.info("Loading classes which are P31-objects")
     load_classes_via_P31(P31_class_hierarchy_file)
     do_work(files, results_dir)
+    sparql_client.close()
+    if instance_cache is not None:
+        instance_cache.close()
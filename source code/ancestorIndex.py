@@ -0,0 +1,262 @@
+import logging
+import os
+import zlib
+from collections import deque
+
+import numpy as np
+
+# the ancestors of the classes of the P279 class hierarchy with their minimum distance in compressed sparse row form
+# next to class_hierarchy_P279.json: the ancestors of classes[i] are ancestors[offsets[i]:offsets[i + 1]] sorted by id,
+# and distances holds the number of P279 relations on the shortest path to each of them
+classes_name = 'class_hierarchy_P279_ancestor_classes.npy'
+offsets_name = 'class_hierarchy_P279_ancestor_offsets.npy'
+ancestors_name = 'class_hierarchy_P279_ancestors.npy'
+distances_name = 'class_hierarchy_P279_ancestor_distances.npy'
+# the fingerprint of the P279 class hierarchy the index was built from, written last, so an index of another hierarchy
+# or one which was not written completely is not used
+fingerprint_name = 'class_hierarchy_P279_ancestor_fingerprint.npy'
+# longer paths are not stored, the analysis gives up after 50 hierarchy levels
+max_distance = 51
+
+no_ancestors = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8))
+
+
+def parents(offsets, superclasses, node):
+    """
+    :param offsets: the offsets of the P279 class hierarchy, see classHierarchy.P279_arrays
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :param node: the numeric id of a class
+    :return: list of the numeric ids of its superclasses
+    """
+    if node + 1 >= len(offsets):
+        return []
+    return superclasses[offsets[node]:offsets[node + 1]].tolist()
+
+
+def strongly_connected_components(offsets, superclasses):
+    """
+    Finds the strongly connected components of the P279 class hierarchy, which are the cycles of subclass relations,
+    with an iterative version of Tarjan's algorithm.
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :return: generator of lists of classes, every component comes after the components of all its ancestors
+    """
+    index = dict()
+    lowlink = dict()
+    on_stack = set()
+    stack = []
+    for root in np.flatnonzero(offsets[1:] != offsets[:-1]).tolist():
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(parents(offsets, superclasses, root)))]
+        while work:
+            node, edges = work[-1]
+            for parent in edges:
+                if parent not in index:
+                    index[parent] = lowlink[parent] = len(index)
+                    stack.append(parent)
+                    on_stack.add(parent)
+                    work.append((parent, iter(parents(offsets, superclasses, parent))))
+                    break
+                elif parent in on_stack:
+                    lowlink[node] = min(lowlink[node], index[parent])
+            else:
+                work.pop()
+                if work:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    yield component
+
+
+def merge(parts):
+    """
+    Merges ancestors, keeping the minimum distance of every ancestor.
+    :param parts: list of (ancestors, distances) arrays
+    :return: tuple of (ancestors, distances) arrays sorted by ancestor, without distances beyond max_distance
+    """
+    if len(parts) == 0:
+        return no_ancestors
+    ancestors = np.concatenate([part[0] for part in parts]).astype(np.uint32)
+    distances = np.concatenate([part[1] for part in parts]).astype(np.int64)
+    inside = distances <= max_distance
+    ancestors, distances = ancestors[inside], distances[inside]
+    order = np.lexsort((distances, ancestors))
+    ancestors, first = np.unique(ancestors[order], return_index=True)
+    return ancestors, distances[order][first].astype(np.uint8)
+
+
+def inner_distances(offsets, superclasses, node, members):
+    """
+    Finds the shortest distances from a class to the classes of its strongly connected component.
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :param node: the numeric id of the class
+    :param members: set of the classes of its component
+    :return: dict of class -> distance, the class itself is reached again via a cycle
+    """
+    distances = dict()
+    queue = deque([(node, 0)])
+    while queue:
+        current, distance = queue.popleft()
+        for parent in parents(offsets, superclasses, current):
+            if parent in members and parent not in distances:
+                distances[parent] = distance + 1
+                queue.append((parent, distance + 1))
+    return distances
+
+
+def build_ancestors(offsets, superclasses):
+    """
+    Finds the ancestors of all classes on the graph of the strongly connected components, which is acyclic. The
+    components are visited after their ancestors, so the ancestors of a class are merged from the ancestors of its
+    superclasses, only the classes of a cycle need a search within their component.
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :return: dict of class -> tuple of (ancestors, distances) arrays, for every class with a superclass
+    """
+    found = dict()
+    for component in strongly_connected_components(offsets, superclasses):
+        node = component[0]
+        if len(component) == 1 and node not in parents(offsets, superclasses, node):
+            node_parents = parents(offsets, superclasses, node)
+            if len(node_parents) != 0:
+                parts = [(np.array(node_parents, dtype=np.uint32), np.ones(len(node_parents), dtype=np.int64))]
+                parts.extend((found[parent][0], found[parent][1].astype(np.int64) + 1) for parent in node_parents if
+                             parent in found)
+                found[node] = merge(parts)
+            continue
+        members = set(component)
+        for node in component:
+            distances = inner_distances(offsets, superclasses, node, members)
+            parts = [(np.array(list(distances.keys()), dtype=np.uint32),
+                      np.array(list(distances.values()), dtype=np.int64))]
+            # the paths leave the component from any of its classes, which the class reaches first
+            for member, distance in (distances | {node: 0}).items():
+                for parent in parents(offsets, superclasses, member):
+                    if parent not in members:
+                        parts.append((np.array([parent], dtype=np.uint32), np.array([distance + 1], dtype=np.int64)))
+                        if parent in found:
+                            parts.append((found[parent][0], found[parent][1].astype(np.int64) + distance + 1))
+            found[node] = merge(parts)
+    return found
+
+
+def fingerprint(offsets, superclasses):
+    """
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :return: array of the lengths and the crc32 checksums of both arrays
+    """
+    return np.array([len(offsets), zlib.crc32(np.ascontiguousarray(offsets)), len(superclasses),
+                     zlib.crc32(np.ascontiguousarray(superclasses))], dtype=np.uint64)
+
+
+def write_ancestor_index(offsets, superclasses, class_hierarchy_dir):
+    """
+    Builds the ancestor index of the P279 class hierarchy and writes it next to class_hierarchy_P279.json.
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :param class_hierarchy_dir: the directory of the class hierarchy
+    :return:
+    """
+    found = build_ancestors(offsets, superclasses)
+    classes = np.array(sorted(found), dtype=np.uint32)
+    lengths = np.array([len(found[node][0]) for node in classes.tolist()], dtype=np.int64)
+    np.save(os.path.join(class_hierarchy_dir, classes_name), classes)
+    np.save(os.path.join(class_hierarchy_dir, offsets_name), np.concatenate(([0], np.cumsum(lengths))))
+    # the ancestors are copied in pieces, so they are only held once in memory
+    for name, part, dtype in ((ancestors_name, 0, np.uint32), (distances_name, 1, np.uint8)):
+        target = np.lib.format.open_memmap(os.path.join(class_hierarchy_dir, name), mode='w+', dtype=dtype,
+                                           shape=(int(lengths.sum()),))
+        position = 0
+        for node in classes.tolist():
+            values = found[node][part]
+            target[position:position + len(values)] = values
+            position += len(values)
+        target.flush()
+        del target
+    np.save(os.path.join(class_hierarchy_dir, fingerprint_name), fingerprint(offsets, superclasses))
+    print("Classes with ancestors:\t", len(classes), "\tAncestor relations:\t", int(lengths.sum()))
+
+
+def search_ancestors(offsets, superclasses, node):
+    """
+    Searches the ancestors of a class with their minimum distance in the P279 class hierarchy.
+    :param offsets: the offsets of the P279 class hierarchy
+    :param superclasses: the superclasses of the P279 class hierarchy
+    :param node: the numeric id of the class
+    :return: tuple of (ancestors, distances) arrays sorted by ancestor
+    """
+    distances = dict()
+    queue = deque([(node, 0)])
+    while queue:
+        current, distance = queue.popleft()
+        if distance == max_distance:
+            continue
+        for parent in parents(offsets, superclasses, current):
+            if parent not in distances:
+                distances[parent] = distance + 1
+                queue.append((parent, distance + 1))
+    if len(distances) == 0:
+        return no_ancestors
+    ancestors = np.array(list(distances.keys()), dtype=np.uint32)
+    order = np.argsort(ancestors)
+    return ancestors[order], np.array(list(distances.values()), dtype=np.uint8)[order]
+
+
+class AncestorIndex:
+    """
+    Ancestors of the classes with their minimum distance. The index written by write_ancestor_index is memory mapped,
+    without it the ancestors of a class are searched in the P279 class hierarchy when it is looked up first.
+    """
+
+    def __init__(self, offsets, superclasses, class_hierarchy_dir=None):
+        """
+        :param offsets: the offsets of the P279 class hierarchy
+        :param superclasses: the superclasses of the P279 class hierarchy
+        :param class_hierarchy_dir: the directory of the ancestor index, the ancestors are searched if None, if it
+        contains no index or if the index was built from another P279 class hierarchy
+        """
+        self.offsets = offsets
+        self.superclasses = superclasses
+        self.found = dict()
+        self.classes = None
+        if class_hierarchy_dir is None or not os.path.exists(os.path.join(class_hierarchy_dir, classes_name)):
+            return
+        fingerprint_path = os.path.join(class_hierarchy_dir, fingerprint_name)
+        if not os.path.exists(fingerprint_path) or \
+                not np.array_equal(np.load(fingerprint_path), fingerprint(offsets, superclasses)):
+            logging.warning('The ancestor index does not belong to the P279 class hierarchy, it is not used. Build it '
+                            'again with getP279ClassHierarchy.')
+            return
+        # plain arrays on the pages of the memory maps, which index faster than the numpy.memmap subclass
+        self.classes, self.ancestor_offsets, self.ancestors, self.distances = (
+            np.asarray(np.load(os.path.join(class_hierarchy_dir, name), mmap_mode='r')) for name in
+            (classes_name, offsets_name, ancestors_name, distances_name))
+
+    def get(self, node):
+        """
+        Looks up the ancestors of a class.
+        :param node: the numeric id of the class
+        :return: tuple of (ancestors, distances) arrays sorted by ancestor, empty if the class has no superclass
+        """
+        if self.classes is not None:
+            # the id has the type of the classes, otherwise the whole array is converted for the search
+            position = int(self.classes.searchsorted(self.classes.dtype.type(node)))
+            if position == len(self.classes) or self.classes[position] != node:
+                return no_ancestors
+            start, end = self.ancestor_offsets[position], self.ancestor_offsets[position + 1]
+            return self.ancestors[start:end], self.distances[start:end]
+        if node not in self.found:
+            self.found[node] = search_ancestors(self.offsets, self.superclasses, node)
+        return self.found[node]
@@ -0,0 +1,99 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+
+# number of items kept in memory in front of the database
+lru_size = 100000
+
+
+class ClassCache:
+    """
+    Persistent cache of Wikidata item -> P31 classes in a SQLite database with an in-memory LRU front. Every entry is
+    tagged with a snapshot, for example the date of the dump, and only entries of the current snapshot are returned,
+    so results of the live endpoint at different times are not mixed. Entries are committed when they are added, so
+    a rerun after a crash does not repeat a lookup.
+    """
+
+    def __init__(self, path, snapshot, size=lru_size):
+        """
+        :param path: the database file, for example class_cache.sqlite, created if it does not exist
+        :param snapshot: the snapshot tag of the entries, for example '20220214'
+        :param size: number of items kept in memory
+        """
+        self.snapshot = str(snapshot)
+        self.size = size
+        self.lru = OrderedDict()
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS classes (snapshot TEXT NOT NULL, item TEXT NOT NULL, '
+                                'classes TEXT NOT NULL, PRIMARY KEY (snapshot, item))')
+        self.connection.commit()
+        count = self.connection.execute('SELECT COUNT(*) FROM classes WHERE snapshot = ?', (self.snapshot,)).fetchone()
+        logging.info('Class cache with %s items of snapshot %s', count[0], self.snapshot)
+
+    def remember(self, item, classes):
+        """
+        Puts an item into the LRU front and evicts the least recently used item if it is full.
+        :param item: the Wikidata item
+        :param classes: list of its classes
+        :return:
+        """
+        self.lru[item] = classes
+        self.lru.move_to_end(item)
+        if len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+
+    def get(self, item):
+        """
+        Looks up the classes of an item.
+        :param item: the Wikidata item, for example 'Q42'
+        :return: list of its classes, empty if it has none, None if the item is not cached
+        """
+        if item in self.lru:
+            self.lru.move_to_end(item)
+            return self.lru[item]
+        row = self.connection.execute('SELECT classes FROM classes WHERE snapshot = ? AND item = ?',
+                                      (self.snapshot, item)).fetchone()
+        if row is None:
+            return None
+        classes = row[0].split()
+        self.remember(item, classes)
+        return classes
+
+    def get_many(self, items):
+        """
+        Looks up the classes of some items.
+        :param items: list of Wikidata items
+        :return: dict of item -> list of its classes, containing the cached items
+        """
+        found = dict()
+        for item in items:
+            classes = self.get(item)
+            if classes is not None:
+                found[item] = classes
+        return found
+
+    def put_many(self, item_classes):
+        """
+        Adds the classes of some items and commits them.
+        :param item_classes: dict of item -> list of its classes, empty if it has none
+        :return:
+        """
+        self.connection.executemany('INSERT OR REPLACE INTO classes VALUES (?, ?, ?)',
+                                    [(self.snapshot, item, ' '.join(classes)) for item, classes in
+                                     item_classes.items()])
+        self.connection.commit()
+        for item, classes in item_classes.items():
+            self.remember(item, list(classes))
+
+    def put(self, item, classes):
+        """
+        Adds the classes of an item and commits them.
+        :param item: the Wikidata item
+        :param classes: list of its classes, empty if it has none
+        :return:
+        """
+        self.put_many({item: classes})
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,163 @@
+import itertools
+import json
+import os
+import re
+
+import numpy as np
+
+# regular expressions of the P279 and P31 lines of the dump
+re_class_line = re.compile(
+    '^<http:\/\/www\.wikidata\.org\/entity\/[Qq][^>]+> <http:\/\/www\.wikidata\.org\/prop\/direct\/[Pp]279> <http:\/\/www\.wikidata\.org\/entity\/[^>]+> \.')
+re_instance_line = re.compile(
+    '^<http:\/\/www\.wikidata\.org\/entity\/[Qq][^>]+> <http:\/\/www\.wikidata\.org\/prop\/direct\/[Pp]31> <http:\/\/www\.wikidata\.org\/entity\/[^>]+> \.')
+re_instance = re.compile('(?<=^<http:\/\/www\.wikidata\.org\/entity\/)[Qq]([^>]+)')
+re_superclass = re.compile('(?<=<http:\/\/www\.wikidata\.org\/entity\/)[Qq]([^>]+)> \.$')
+
+# every matching line contains these terms, the regular expressions are skipped for all other lines
+P279_term = '279> <http://www.wikidata.org/entity/'
+P31_term = '31> <http://www.wikidata.org/entity/'
+P279_term_bytes = P279_term.encode()
+P31_term_bytes = P31_term.encode()
+
+# the P279 class hierarchy in compressed sparse row form next to its .json file: the sorted superclasses of the class
+# with the numeric id i are superclasses[offsets[i]:offsets[i + 1]], offsets has an entry per id up to the largest class
+P279_offsets_name = 'class_hierarchy_P279_offsets.npy'
+P279_superclasses_name = 'class_hierarchy_P279_superclasses.npy'
+# the P31 objects as packed bitset next to their .json file, bit i (little endian within a byte) is set if Qi is a P31
+# object
+P31_bitset_name = 'class_hierarchy_P31_bitset.npy'
+
+
+def add_P279_line(line, hierarchy):
+    """
+    Adds the superclass of a P279 line of the dump to the class hierarchy, other lines are ignored.
+    :param line: a line of the dump as str or bytes
+    :param hierarchy: dict of class -> list of superclasses
+    :return:
+    """
+    if isinstance(line, bytes):
+        if P279_term_bytes not in line:
+            return
+        line = line.decode('utf-8')
+    elif P279_term not in line:
+        return
+    if len(re.findall(re_class_line, line)) == 1:
+        instance = (re.findall(re_instance, line)[0])
+        superclass = (re.findall(re_superclass, line)[0])
+        if instance not in hierarchy:
+            hierarchy[instance] = list()
+            hierarchy[instance].append(superclass)
+        else:
+            hierarchy[instance].append(superclass)
+
+
+def add_P31_line(line, all_p31_objects, class_index=None):
+    """
+    Adds the object of a P31 line of the dump to the set of P31 objects, other lines are ignored.
+    :param line: a line of the dump as str or bytes
+    :param all_p31_objects: set of the numeric ids of all P31 objects
+    :param class_index: optional classIndex.ClassIndexWriter, which additionally records the item of the line
+    :return:
+    """
+    if isinstance(line, bytes):
+        if P31_term_bytes not in line:
+            return
+        line = line.decode('utf-8')
+    elif P31_term not in line:
+        return
+    if len(re.findall(re_instance_line, line)) == 1:
+        class_object = int((re.findall(re_superclass, line)[0]))
+        all_p31_objects.add(class_object)
+        if class_index is not None:
+            class_index.add(int(re.findall(re_instance, line)[0]), class_object)
+
+
+def write_P279_hierarchy(hierarchy, P279_class_hierarchy_file):
+    """
+    Writes the P279 class hierarchy, as .json and in compressed sparse row form into the same directory.
+    :param hierarchy: dict of class -> list of superclasses
+    :param P279_class_hierarchy_file: the output file for the P279 class hierarchy
+    :return:
+    """
+    out_file = open(P279_class_hierarchy_file, 'w')
+    json.dump(hierarchy, out_file)
+    out_file.close()
+    offsets, superclasses = P279_arrays(hierarchy)
+    class_hierarchy_dir = os.path.dirname(P279_class_hierarchy_file)
+    np.save(os.path.join(class_hierarchy_dir, P279_offsets_name), offsets)
+    np.save(os.path.join(class_hierarchy_dir, P279_superclasses_name), superclasses)
+
+
+def P279_arrays(hierarchy):
+    """
+    Converts the P279 class hierarchy into compressed sparse row form.
+    :param hierarchy: dict of class -> list of superclasses, the numeric ids as str or int
+    :return: tuple of (offsets, superclasses) arrays
+    """
+    int_hierarchy = {int(key): sorted(int(value) for value in value_list) for key, value_list in hierarchy.items()}
+    classes = sorted(int_hierarchy)
+    counts = np.zeros((classes[-1] if classes else -1) + 2, dtype=np.int32)
+    counts[np.array(classes, dtype=np.int64) + 1] = [len(int_hierarchy[key]) for key in classes]
+    offsets = np.cumsum(counts, dtype=np.int32)
+    superclasses = np.fromiter(itertools.chain.from_iterable(int_hierarchy[key] for key in classes), dtype=np.uint32,
+                               count=int(offsets[-1]))
+    return offsets, superclasses
+
+
+def load_P279_arrays(class_hierarchy_dir):
+    """
+    Memory maps the P279 class hierarchy in compressed sparse row form, so the pages are shared between processes.
+    :param class_hierarchy_dir: the directory of the class hierarchy
+    :return: tuple of (offsets, superclasses) arrays
+    """
+    return tuple(np.load(os.path.join(class_hierarchy_dir, name), mmap_mode='r') for name in
+                 (P279_offsets_name, P279_superclasses_name))
+
+
+def write_P31_objects(all_p31_objects, P31_class_hierarchy_file):
+    """
+    Writes the sorted P31 objects, as .json and as packed bitset into the same directory.
+    :param all_p31_objects: set of the numeric ids of all P31 objects
+    :param P31_class_hierarchy_file: the output file for the P31 objects class hierarchy
+    :return:
+    """
+    out_file = open(P31_class_hierarchy_file, 'w')
+    l_all_p31_objects = sorted(list(all_p31_objects))
+    json.dump(l_all_p31_objects, out_file)
+    out_file.close()
+    np.save(os.path.join(os.path.dirname(P31_class_hierarchy_file), P31_bitset_name), P31_bitset(l_all_p31_objects))
+
+
+def P31_bitset(p31_objects):
+    """
+    Packs the P31 objects into a bitset.
+    :param p31_objects: list of the numeric ids of the P31 objects
+    :return: uint8 array, in which bit i is set if i is a P31 object
+    """
+    objects = np.array(p31_objects, dtype=np.int64)
+    bits = np.zeros(int(objects.max()) + 1 if len(objects) else 0, dtype=bool)
+    bits[objects] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def load_P31_bitset(class_hierarchy_dir):
+    """
+    Loads the packed bitset of the P31 objects.
+    :param class_hierarchy_dir: the directory of the class hierarchy
+    :return: uint8 array, in which bit i is set if i is a P31 object
+    """
+    return np.load(os.path.join(class_hierarchy_dir, P31_bitset_name))
+
+
+def contains(bitset, numbers):
+    """
+    Checks vectorized whether numbers are in a packed bitset.
+    :param bitset: uint8 array of P31_bitset
+    :param numbers: int64 array of numbers
+    :return: bool array, False for numbers beyond the bitset
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    inside = (numbers >= 0) & (numbers < len(bitset) * 8)
+    found = np.zeros(len(numbers), dtype=bool)
+    found[inside] = (bitset[numbers[inside] >> 3] >> (numbers[inside] & 7)) & 1 == 1
+    return found
@@ -0,0 +1,118 @@
+import os
+from array import array
+
+import numpy as np
+
+# the index of the P31 classes of all items in compressed sparse row form: items holds the sorted numeric ids of the
+# items (42 for Q42) and the classes of items[i] are classes[offsets[i]:offsets[i + 1]] in the order of the dump
+items_name = 'p31_index_items.npy'
+offsets_name = 'p31_index_offsets.npy'
+classes_name = 'p31_index_classes.npy'
+buffer_size = 1 << 20
+
+
+class ClassIndexWriter:
+    """
+    Collects the P31 statements of the dump and writes them as index of item -> P31 classes. The pairs are streamed
+    into temporary files first and sorted by item at the end.
+    """
+
+    def __init__(self, index_dir):
+        """
+        :param index_dir: the directory of the index
+        """
+        self.index_dir = index_dir
+        self.items = array('I')
+        self.classes = array('I')
+        self.count = 0
+        self.items_file = open(self.path(items_name) + '.tmp', 'wb')
+        self.classes_file = open(self.path(classes_name) + '.tmp', 'wb')
+
+    def path(self, name):
+        """
+        :param name: the file name of an array
+        :return: the path of the array
+        """
+        return os.path.join(self.index_dir, name)
+
+    def add(self, item, item_class):
+        """
+        Adds a P31 statement.
+        :param item: the numeric id of the item
+        :param item_class: the numeric id of the class
+        :return:
+        """
+        self.items.append(item)
+        self.classes.append(item_class)
+        self.count += 1
+        if len(self.items) >= buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered pairs to the temporary files.
+        """
+        self.items.tofile(self.items_file)
+        self.classes.tofile(self.classes_file)
+        self.items = array('I')
+        self.classes = array('I')
+
+    def close(self):
+        """
+        Sorts the pairs by item, the classes of an item keep the order of the dump, and writes the index.
+        """
+        self.flush()
+        self.items_file.close()
+        self.classes_file.close()
+        items = np.fromfile(self.path(items_name) + '.tmp', dtype=np.uint32)
+        classes = np.fromfile(self.path(classes_name) + '.tmp', dtype=np.uint32)
+        order = np.argsort(items, kind='stable')
+        unique_items, starts = np.unique(items[order], return_index=True)
+        np.save(self.path(items_name), unique_items)
+        np.save(self.path(offsets_name), np.append(starts, len(items)).astype(np.int64))
+        np.save(self.path(classes_name), classes[order])
+        del items, classes, order
+        os.remove(self.path(items_name) + '.tmp')
+        os.remove(self.path(classes_name) + '.tmp')
+
+
+class ClassIndex:
+    """
+    Read only view of the index of item -> P31 classes, which is memory mapped.
+    """
+
+    def __init__(self, index_dir):
+        """
+        :param index_dir: the directory of the index
+        """
+        self.items = np.load(os.path.join(index_dir, items_name), mmap_mode='r')
+        self.offsets = np.load(os.path.join(index_dir, offsets_name), mmap_mode='r')
+        self.classes = np.load(os.path.join(index_dir, classes_name), mmap_mode='r')
+
+    def get(self, wd_item):
+        """
+        Looks up the P31 classes of an item.
+        :param wd_item: the Wikidata item, for example 'Q42'
+        :return: list of the classes, for example ['Q5'], empty if the item has no P31 statement
+        """
+        number = int(wd_item[1:])
+        position = int(np.searchsorted(self.items, number))
+        if position == len(self.items) or self.items[position] != number:
+            return []
+        return ['Q' + str(item_class) for item_class in
+                self.classes[self.offsets[position]:self.offsets[position + 1]].tolist()]
+
+    def memberships(self, wd_items):
+        """
+        Looks up the P31 classes of some items at once, like the SPARQL query of getClassMembership.
+        :param wd_items: list of Wikidata items
+        :return: dict of item -> list of classes, containing the items with at least one P31 statement
+        """
+        numbers = np.array([int(wd_item[1:]) for wd_item in wd_items], dtype=np.int64)
+        positions = np.searchsorted(self.items, numbers)
+        d_result = dict()
+        for wd_item, number, position in zip(wd_items, numbers.tolist(), positions.tolist()):
+            if position < len(self.items) and self.items[position] == number:
+                d_result[wd_item] = ['Q' + str(item_class) for item_class in
+                                     self.classes[self.offsets[position]:self.offsets[position + 1]].tolist()]
+        return d_result
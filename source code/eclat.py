@@ -0,0 +1,535 @@
+import json
+import os
+import shutil
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+
+import patternSets
+import transactionDatabase
+
+# the vertical database: the tid-lists of the frequent items concatenated in the order of their rank, the tid-list of
+# rank r is tidlists[tidlist_offsets[r]:tidlist_offsets[r + 1]]
+tidlists_name = 'eclat_tidlists.npy'
+tidlist_offsets_name = 'eclat_tidlist_offsets.npy'
+# the added transactions of an incremental run
+added_name = 'eclat_added.npy'
+# the state for incremental mining: the minimum support and all frequent itemsets of the last run, next to a copy of its
+# transaction database
+state_name = 'eclat_state.json'
+state_patterns_name = 'eclat_patterns.txt'
+# number of delta transactions per block and bytes of bitmaps combined at once in an incremental run
+delta_block_size = 1 << 16
+delta_memory = 1 << 26
+# number of set bits of every byte
+popcount_table = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+# the transaction database, the vertical database and the frequent items of a worker process
+worker_offsets = None
+worker_transaction_items = None
+worker_tidlists = None
+worker_tidlist_offsets = None
+worker_items = None
+worker_supports = None
+worker_ranks = None
+worker_added = None
+
+
+def popcount(bitmaps):
+    """
+    Counts the set bits of every row of packed bitmaps.
+    :param bitmaps: 2d array of uint8
+    :return: array of the counts per row
+    """
+    if hasattr(np, 'bitwise_count'):
+        # NumPy 2
+        return np.bitwise_count(bitmaps).sum(axis=1, dtype=np.int64)
+    return popcount_table[bitmaps].sum(axis=1, dtype=np.int64)
+
+
+def pattern_line(pattern, support):
+    """
+    Formats a frequent itemset like Dist-Eclat, the items are sorted as strings and followed by the support.
+    :param pattern: list of item ids
+    :param support: the support of the itemset
+    :return: the line
+    """
+    return ' '.join(sorted(map(str, pattern))) + " (" + str(support) + ")\n"
+
+
+def rank_items(items, min_support):
+    """
+    Ranks the frequent items by ascending support, items with the same support by their id.
+    :param items: the items of the transactions
+    :param min_support: minimum number of supporting transactions
+    :return: tuple of (item ids by rank, supports by rank, rank by item id with -1 for infrequent items)
+    """
+    counts = np.bincount(items) if len(items) != 0 else np.zeros(0, dtype=np.int64)
+    frequent_items = np.flatnonzero(counts >= min_support)
+    ranked_items = frequent_items[np.argsort(counts[frequent_items], kind='stable')].astype(np.uint32)
+    supports = counts[ranked_items].astype(np.int64)
+    rank = np.full(len(counts), -1, dtype=np.int64)
+    rank[ranked_items] = np.arange(len(ranked_items))
+    return ranked_items, supports, rank
+
+
+def build_vertical_database(transaction_db_path, min_support):
+    """
+    Turns the transaction database in compressed sparse row form into tid-lists of the frequent items. The frequent
+    items are ranked by ascending support, which keeps the equivalence classes of the frequent prefixes small, and the
+    tid-lists are stored in the transaction database directory so the worker processes can memory map them.
+    :param transaction_db_path: the directory of the transaction database
+    :param min_support: minimum number of supporting transactions
+    :return: tuple of (item ids by rank, supports by rank, rank by item id with -1 for infrequent items)
+    """
+    offsets, items, _ = transactionDatabase.load_transactions(transaction_db_path)
+    ranked_items, supports, rank = rank_items(items, min_support)
+    tids = np.repeat(np.arange(len(offsets) - 1, dtype=np.uint32), np.diff(offsets))
+    item_ranks = rank[items]
+    frequent = item_ranks >= 0
+    # the stable sort keeps the tids of every tid-list in ascending order
+    order = np.argsort(item_ranks[frequent], kind='stable')
+    np.save(os.path.join(transaction_db_path, tidlists_name), tids[frequent][order])
+    np.save(os.path.join(transaction_db_path, tidlist_offsets_name), np.concatenate(([0], np.cumsum(supports))))
+    return ranked_items, supports, rank
+
+
+def row_positions(offsets, rows):
+    """
+    Computes the positions of the items of some transactions in the items array of the compressed sparse row form.
+    :param offsets: the offsets of the transactions
+    :param rows: array of transaction indices
+    :return: tuple of (positions, number of items per transaction)
+    """
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+    return positions, lengths
+
+
+def init_worker(transaction_db_path, ranked_items, supports, ranks, restricted=False):
+    """
+    Memory maps the transaction database and the vertical database once per worker process.
+    :param transaction_db_path: the directory of the transaction database
+    :param ranked_items: item ids by rank
+    :param supports: supports by rank
+    :param ranks: rank by item id, -1 for infrequent items
+    :param restricted: only itemsets contained in one of the added transactions are mined
+    :return:
+    """
+    global worker_offsets, worker_transaction_items, worker_tidlists, worker_tidlist_offsets, worker_items, \
+        worker_supports, worker_ranks, worker_added
+    worker_offsets, worker_transaction_items, _ = transactionDatabase.load_transactions(transaction_db_path)
+    worker_tidlists = np.load(os.path.join(transaction_db_path, tidlists_name), mmap_mode='r')
+    worker_tidlist_offsets = np.load(os.path.join(transaction_db_path, tidlist_offsets_name))
+    worker_items = ranked_items
+    worker_supports = supports
+    worker_ranks = ranks
+    worker_added = np.load(os.path.join(transaction_db_path, added_name), mmap_mode='r') if restricted else None
+
+
+def release_worker():
+    """
+    Releases the memory maps of the vertical database, so its files can be removed.
+    :return:
+    """
+    global worker_offsets, worker_transaction_items, worker_tidlists, worker_tidlist_offsets, worker_items, \
+        worker_supports, worker_ranks, worker_added
+    worker_offsets = worker_transaction_items = worker_tidlists = worker_tidlist_offsets = None
+    worker_items = worker_supports = worker_ranks = worker_added = None
+
+
+def tidlist(rank):
+    """
+    :param rank: the rank of a frequent item
+    :return: the tid-list of the item
+    """
+    return np.asarray(worker_tidlists[worker_tidlist_offsets[rank]:worker_tidlist_offsets[rank + 1]])
+
+
+def prefix_class(rank, prefix_tidlist, min_support, added=None):
+    """
+    Builds the equivalence class of a prefix item in one pass over the transactions of the prefix: the frequent items
+    of a higher rank which occur together with the prefix, each with a bitmap over the tid-list of the prefix.
+    :param rank: the rank of the prefix item
+    :param prefix_tidlist: the tid-list of the prefix item
+    :param min_support: minimum number of supporting transactions
+    :param added: boolean array of the added transactions of the tid-list, if only itemsets contained in one of them
+     are mined
+    :return: tuple of (item ids, supports, packed bitmaps, packed bitmaps over the added transactions or None) of the
+     members of the class
+    """
+    positions, lengths = row_positions(worker_offsets, prefix_tidlist)
+    # the transaction of every position within the class
+    columns = np.repeat(np.arange(len(prefix_tidlist)), lengths)
+    ranks = worker_ranks[worker_transaction_items[positions]]
+    later = ranks > rank
+    ranks = ranks[later]
+    columns = columns[later]
+    member_ranks = np.flatnonzero(np.bincount(ranks, minlength=len(worker_items)) >= min_support)
+    member_index = np.full(len(worker_items), -1, dtype=np.int64)
+    member_index[member_ranks] = np.arange(len(member_ranks))
+    rows = member_index[ranks]
+    member = rows >= 0
+    rows = rows[member]
+    columns = columns[member]
+    bitmaps = np.zeros((len(member_ranks), (len(prefix_tidlist) + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(bitmaps, (rows, columns >> 3), np.left_shift(1, columns & 7).astype(np.uint8))
+    if added is None:
+        return worker_items[member_ranks], popcount(bitmaps), bitmaps, None
+    # the same bitmaps reduced to the added transactions, which decide whether an itemset is mined
+    added_columns = (np.cumsum(added) - 1)[columns]
+    in_added = added[columns]
+    added_bitmaps = np.zeros((len(member_ranks), (int(added.sum()) + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(added_bitmaps, (rows[in_added], added_columns[in_added] >> 3),
+                     np.left_shift(1, added_columns[in_added] & 7).astype(np.uint8))
+    member = added_bitmaps.any(axis=1)
+    return worker_items[member_ranks][member], popcount(bitmaps[member]), bitmaps[member], added_bitmaps[member]
+
+
+def mine_class(prefix, items, supports, bitmaps, min_support, min_length, lines, added_bitmaps=None):
+    """
+    Mines an equivalence class depth first. The members of the class are bitmaps over the tid-list of the prefix item,
+    so every itemset is intersected with all later members of its class at once.
+    :param prefix: list of item ids of the common prefix
+    :param items: item ids of the frequent extensions of the prefix
+    :param supports: supports of the extended prefixes
+    :param bitmaps: packed bitmaps of the extended prefixes, one row per item
+    :param min_support: minimum number of supporting transactions
+    :param min_length: minimum number of items of a written itemset
+    :param lines: list receiving the formatted itemsets
+    :param added_bitmaps: packed bitmaps of the extended prefixes over the added transactions, if only itemsets
+     contained in one of them are mined
+    :return:
+    """
+    for index in range(len(items)):
+        pattern = prefix + [int(items[index])]
+        if len(pattern) >= min_length:
+            lines.append(pattern_line(pattern, int(supports[index])))
+        if index + 1 == len(items):
+            continue
+        candidates = slice(index + 1, None)
+        added_extensions = None
+        if added_bitmaps is not None:
+            added_extensions = added_bitmaps[candidates] & added_bitmaps[index]
+            in_added = added_extensions.any(axis=1)
+            candidates = np.flatnonzero(in_added) + index + 1
+            added_extensions = added_extensions[in_added]
+        extensions = bitmaps[candidates] & bitmaps[index]
+        extension_supports = popcount(extensions)
+        frequent = extension_supports >= min_support
+        if frequent.any():
+            mine_class(pattern, items[candidates][frequent], extension_supports[frequent], extensions[frequent],
+                       min_support, min_length, lines, None if added_extensions is None else added_extensions[frequent])
+
+
+def mine_prefix(rank, min_support, min_length):
+    """
+    Mines all frequent itemsets whose least frequent item is the frequent item of a rank. The equivalence classes of
+    the ranks are independent, so they are mined by the worker processes.
+    :param rank: the rank of the prefix item
+    :param min_support: minimum number of supporting transactions
+    :param min_length: minimum number of items of a written itemset
+    :return: list of the formatted itemsets
+    """
+    lines = []
+    item = int(worker_items[rank])
+    if min_length <= 1:
+        lines.append(pattern_line([item], int(worker_supports[rank])))
+    prefix_tidlist = tidlist(rank)
+    added = None if worker_added is None else np.asarray(worker_added[prefix_tidlist])
+    items, supports, bitmaps, added_bitmaps = prefix_class(rank, prefix_tidlist, min_support, added)
+    mine_class([item], items, supports, bitmaps, min_support, min_length, lines, added_bitmaps)
+    return lines
+
+
+def mine_patterns(transaction_db_path, min_support, min_length=1, processes=1, added=None):
+    """
+    Mines the frequent itemsets of the transaction database with Eclat.
+    :param transaction_db_path: the directory of the transaction database
+    :param min_support: minimum number of supporting transactions
+    :param min_length: minimum number of items of a returned itemset, shorter itemsets are mined but not returned
+    :param processes: number of worker processes, all cores if None, 1 mines in this process
+    :param added: boolean array of the added transactions, if only itemsets contained in one of them are mined
+    :return: generator of the itemsets formatted like Dist-Eclat
+    """
+    if min_support < 1:
+        raise ValueError('The minimum support must be at least 1, not ' + str(min_support))
+    print("Building the tid-lists of the frequent items")
+    ranked_items, supports, ranks = build_vertical_database(transaction_db_path, min_support)
+    prefix_ranks = range(len(ranked_items))
+    if added is not None:
+        np.save(os.path.join(transaction_db_path, added_name), added)
+        # a prefix has to occur in one of the added transactions
+        offsets, items, _ = transactionDatabase.load_transactions(transaction_db_path)
+        positions, _ = row_positions(offsets, np.flatnonzero(added))
+        prefix_ranks = np.unique(ranks[items[positions]])
+        prefix_ranks = prefix_ranks[prefix_ranks >= 0].tolist()
+        del offsets, items, positions
+    print("Frequent items:\t", len(ranked_items), "\tprefixes:\t", len(prefix_ranks))
+    initargs = (transaction_db_path, ranked_items, supports, ranks, added is not None)
+    mine_rank = partial(mine_prefix, min_support=min_support, min_length=min_length)
+    try:
+        if processes != 1:
+            with Pool(processes, initializer=init_worker, initargs=initargs) as pool:
+                # the prefixes are handed out one by one, since the size of their classes differs a lot
+                for lines in pool.imap(mine_rank, prefix_ranks, chunksize=1):
+                    yield from lines
+        else:
+            init_worker(*initargs)
+            for lines in map(mine_rank, prefix_ranks):
+                yield from lines
+    finally:
+        release_worker()
+        for name in (tidlists_name, tidlist_offsets_name, added_name):
+            if os.path.exists(os.path.join(transaction_db_path, name)):
+                os.remove(os.path.join(transaction_db_path, name))
+
+
+def pattern_length(line):
+    """
+    :param line: an itemset formatted like Dist-Eclat
+    :return: the number of items of the itemset
+    """
+    return line.count(' ')
+
+
+def mining_order(lines, rank):
+    """
+    Sorts itemsets into the order in which mine_patterns finds them: the prefixes by rank and every equivalence class
+    depth first, which is the lexicographic order of the ranks of the items of an itemset.
+    :param lines: itemsets formatted like Dist-Eclat
+    :param rank: rank by item id of the mined transaction database
+    :return: the sorted lines
+    """
+    return sorted(lines, key=lambda line: sorted(rank[int(item)] for item in line.split(' ')[:-1]))
+
+
+def save_state(state_path, transaction_db_path, min_support, lines):
+    """
+    Saves the state of a run for the incremental mining of the next transaction database: the minimum support, all
+    frequent itemsets with their support and a copy of the mined transaction database. Every file is written under a
+    temporary name and replaced afterwards, eclat_state.json last with the numbers of transactions, items and itemsets,
+    so update detects a state which was interrupted in between.
+    :param state_path: the directory of the state
+    :param transaction_db_path: the directory of the mined transaction database
+    :param min_support: minimum number of supporting transactions
+    :param lines: all frequent itemsets formatted like Dist-Eclat
+    :return:
+    """
+    names = []
+    if os.path.abspath(transaction_db_path) != os.path.abspath(state_path):
+        for name in (transactionDatabase.offsets_name, transactionDatabase.items_name,
+                     transactionDatabase.entities_name):
+            shutil.copyfile(os.path.join(transaction_db_path, name), os.path.join(state_path, name + '.tmp'))
+            names.append(name)
+    with open(os.path.join(state_path, state_patterns_name + '.tmp'), 'w') as file:
+        file.writelines(lines)
+    names.append(state_patterns_name)
+    offsets, items, entities = transactionDatabase.load_transactions(transaction_db_path)
+    with open(os.path.join(state_path, state_name + '.tmp'), 'w') as file:
+        json.dump({'min_support': min_support, 'transactions': len(entities), 'items': len(items),
+                   'itemsets': len(lines)}, file)
+    del offsets, items, entities
+    names.append(state_name)
+    for name in names:
+        os.replace(os.path.join(state_path, name + '.tmp'), os.path.join(state_path, name))
+
+
+def load_state(state_path):
+    """
+    Loads the state of the previous run and checks that its files belong together.
+    :param state_path: the directory of the state
+    :return: tuple of (minimum support, tuple of (offsets, items, entities) of the mined transaction database, list of
+     the frequent itemsets as lists of item ids, list of their supports)
+    """
+    with open(os.path.join(state_path, state_name), 'r') as file:
+        state = json.load(file)
+    transactions = transactionDatabase.load_transactions(state_path)
+    patterns = []
+    supports = []
+    for items, support in patternSets.read_patterns(os.path.join(state_path, state_patterns_name)):
+        patterns.append(list(map(int, items)))
+        supports.append(support)
+    if (state.get('transactions'), state.get('items'), state.get('itemsets')) != (
+            len(transactions[2]), len(transactions[1]), len(patterns)):
+        raise ValueError('The state in ' + str(state_path) + ' is incomplete, the last run was interrupted while '
+                         'saving it. Mine the transaction database again with a new state.')
+    return state['min_support'], transactions, patterns, supports
+
+
+def mine(transaction_db_path, output_file, min_support, min_length=1, processes=1, state_path=None):
+    """
+    Mines the frequent itemsets of the transaction database with Eclat and writes them in the format of Dist-Eclat.
+    :param transaction_db_path: the directory of the transaction database, with the .npy files of
+     createTransactionDatabase
+    :param output_file: the output file, for example out.txt
+    :param min_support: minimum number of supporting transactions
+    :param min_length: minimum number of items of a written itemset, shorter itemsets are mined but not written
+    :param processes: number of worker processes, all cores if None, 1 mines in this process
+    :param state_path: directory to save the state for incremental mining in, None to keep no state
+    :return: number of written itemsets
+    """
+    written = 0
+    lines = []
+    with open(output_file, 'w') as out_file:
+        # the state needs the short itemsets as well
+        for line in mine_patterns(transaction_db_path, min_support, 1 if state_path else min_length, processes):
+            if pattern_length(line) >= min_length:
+                out_file.write(line)
+                written += 1
+            if state_path is not None:
+                lines.append(line)
+    if state_path is not None:
+        save_state(state_path, transaction_db_path, min_support, lines)
+    print("Frequent itemsets:\t", written)
+    return written
+
+
+def transaction_delta(old_transactions, new_transactions):
+    """
+    Compares two transaction databases by their Wikidata items. A transaction of a changed item counts as removed
+    from the old and as added to the new database.
+    :param old_transactions: tuple of (offsets, items, entities) of the old database
+    :param new_transactions: tuple of (offsets, items, entities) of the new database
+    :return: tuple of (boolean array of the removed old transactions, boolean array of the added new transactions)
+    """
+    old_offsets, old_items, old_entities = old_transactions
+    new_offsets, new_items, new_entities = new_transactions
+    _, old_rows, new_rows = np.intersect1d(old_entities, new_entities, return_indices=True)
+    same_length = np.diff(old_offsets)[old_rows] == np.diff(new_offsets)[new_rows]
+    old_rows = old_rows[same_length]
+    new_rows = new_rows[same_length]
+    old_positions, lengths = row_positions(old_offsets, old_rows)
+    new_positions, _ = row_positions(new_offsets, new_rows)
+    equal = np.asarray(old_items[old_positions]) == np.asarray(new_items[new_positions])
+    # the transactions are never empty, so every row has a start in equal
+    row_starts = np.cumsum(lengths) - lengths
+    unchanged = np.logical_and.reduceat(equal, row_starts) if len(row_starts) != 0 else np.zeros(0, dtype=bool)
+    removed = np.ones(len(old_entities), dtype=bool)
+    removed[old_rows[unchanged]] = False
+    added = np.ones(len(new_entities), dtype=bool)
+    added[new_rows[unchanged]] = False
+    return removed, added
+
+
+def delta_supports(patterns, offsets, items, rows):
+    """
+    Counts the transactions of a delta which contain each itemset. The transactions are processed in blocks, and within
+    a block the itemsets of the same length are counted at once with bitmaps of their items over the block.
+    :param patterns: list of lists of item ids
+    :param offsets: the offsets of the transactions
+    :param items: the items of the transactions
+    :param rows: boolean array of the transactions of the delta
+    :return: array of the supports within the delta
+    """
+    supports = np.zeros(len(patterns), dtype=np.int64)
+    by_length = dict()
+    for index, pattern in enumerate(patterns):
+        by_length.setdefault(len(pattern), []).append(index)
+    by_length = [(np.array(indices), np.array([patterns[index] for index in indices], dtype=np.int64)) for
+                 indices in by_length.values()]
+    delta_rows = np.flatnonzero(rows)
+    for block_start in range(0, len(delta_rows), delta_block_size):
+        block_rows = delta_rows[block_start:block_start + delta_block_size]
+        positions, lengths = row_positions(offsets, block_rows)
+        block_items, item_index = np.unique(np.asarray(items[positions]), return_inverse=True)
+        columns = np.repeat(np.arange(len(block_rows)), lengths)
+        # the last bitmap stays empty, it stands for the items which are not in the block
+        bitmaps = np.zeros((len(block_items) + 1, (len(block_rows) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(bitmaps, (item_index, columns >> 3), np.left_shift(1, columns & 7).astype(np.uint8))
+        for indices, pattern_items in by_length:
+            bitmap_rows = np.searchsorted(block_items, pattern_items)
+            found = block_items[np.minimum(bitmap_rows, len(block_items) - 1)] == pattern_items
+            bitmap_rows = np.where(found, bitmap_rows, len(block_items))
+            chunk_size = max(1, delta_memory // bitmaps[:1].size // pattern_items.shape[1])
+            for start in range(0, len(indices), chunk_size):
+                common = np.bitwise_and.reduce(bitmaps[bitmap_rows[start:start + chunk_size]], axis=1)
+                supports[indices[start:start + chunk_size]] += popcount(common)
+    return supports
+
+
+def update(state_path, transaction_db_path, output_file, min_length=1, processes=1):
+    """
+    Mines the frequent itemsets of a new transaction database incrementally from the state of the previous run, with
+    the same result as a full run. An itemset which is not contained in an added transaction can only lose support,
+    so it was frequent before and its new support is the old one minus the removed transactions containing it. All
+    other frequent itemsets are contained in an added transaction and are mined in the new database, restricted to
+    these itemsets. The state is updated to the new database afterwards, an incomplete state raises a ValueError.
+    :param state_path: the directory of the state of the previous run
+    :param transaction_db_path: the directory of the new transaction database
+    :param output_file: the output file, for example out.txt
+    :param min_length: minimum number of items of a written itemset
+    :param processes: number of worker processes, all cores if None, 1 mines in this process
+    :return: number of written itemsets
+    """
+    min_support, old_transactions, patterns, old_supports = load_state(state_path)
+    new_transactions = transactionDatabase.load_transactions(transaction_db_path)
+    removed, added = transaction_delta(old_transactions, new_transactions)
+    print("Removed transactions:\t", int(removed.sum()), "\tadded transactions:\t", int(added.sum()))
+    added_supports = delta_supports(patterns, new_transactions[0], new_transactions[1], added)
+    _, _, rank = rank_items(new_transactions[1], min_support)
+    supports = np.array(old_supports, dtype=np.int64) - delta_supports(patterns, old_transactions[0],
+                                                                       old_transactions[1], removed)
+    del old_transactions, new_transactions
+    lines = [pattern_line(patterns[index], int(supports[index])) for index in
+             np.flatnonzero((added_supports == 0) & (supports >= min_support))]
+    print("Itemsets without added transactions:\t", len(lines))
+    lines.extend(mine_patterns(transaction_db_path, min_support, 1, processes, added))
+    # the same order as a full run, so the output and the state do not depend on the run being incremental
+    lines = mining_order(lines, rank.tolist())
+    written = 0
+    with open(output_file, 'w') as out_file:
+        for line in lines:
+            if pattern_length(line) >= min_length:
+                out_file.write(line)
+                written += 1
+    save_state(state_path, transaction_db_path, min_support, lines)
+    print("Frequent itemsets:\t", written)
+    return written
+
+
+if __name__ == '__main__':
+    """
+    The main method reads paths and makes sure they exist before calculations start.
+    """
+    mine_db = input("Do you want to mine the transaction database? (y/n, n only filters an existing out.txt):\t")
+    if mine_db.upper() == 'Y':
+        transaction_db_path = input(
+            "Enter the directory of the transaction database with the .npy files (Example: C:\dump\\transactiondb):\t")
+        transaction_db_path = transaction_db_path.replace('"', '').replace("'", "")
+        assert os.path.exists(transaction_db_path), "Path not found at:\t" + str(transaction_db_path)
+        output_path = input("Enter the output directory for out.txt (Example: C:\dump\dist-eclat):\t")
+        output_path = output_path.replace('"', '').replace("'", "")
+        assert os.path.exists(output_path), "Path not found at:\t" + str(output_path)
+        pattern_file = output_path + "\\out.txt"
+        state_path = input("Enter the directory of the state for incremental mining, the state of a previous run is "
+                           "updated (Example: C:\dump\dist-eclat\state, leave empty to keep no state):\t")
+        state_path = state_path.replace('"', '').replace("'", "")
+        state_path = state_path if state_path.strip() else None
+        if state_path is not None:
+            assert os.path.exists(state_path), "Path not found at:\t" + str(state_path)
+        incremental = state_path is not None and os.path.exists(os.path.join(state_path, state_name))
+        if not incremental:
+            min_support = int(input("Enter the minimum support as number of transactions (Example: 200):\t"))
+        min_length = input(
+            "Enter the minimum number of items of a written itemset (Example: 3, leave empty for 1):\t")
+        min_length = int(min_length) if min_length.strip() else 1
+        processes = 1
+        parallel = input("Do you want to mine the prefixes in parallel? (y/n):\t")
+        if parallel.upper() == 'Y':
+            processes = input("Enter the number of worker processes (Example: 64, leave empty to use all cores):\t")
+            processes = int(processes) if processes.strip() else None
+        if incremental:
+            update(state_path, transaction_db_path, pattern_file, min_length, processes)
+        else:
+            mine(transaction_db_path, pattern_file, min_support, min_length, processes, state_path)
+    else:
+        pattern_file = input("Enter the path of the output of Dist-Eclat (Example: C:\dump\dist-eclat\out.txt):\t")
+        pattern_file = pattern_file.replace('"', '').replace("'", "")
+        assert os.path.exists(pattern_file), "File not found at:\t" + str(pattern_file)
+    mode = input("Which patterns do you want to keep in addition to all patterns? (closed/maximal, leave empty for "
+                 "none):\t")
+    if mode.strip():
+        patternSets.filter_pattern_file(pattern_file, mode.strip().lower())
@@ -0,0 +1,159 @@
+import mmap
+import struct
+import zlib
+from array import array
+
+# layout of the binary item database, all numbers are unsigned 32 bit integers in native byte order:
+# header, names of the properties separated by newlines (padded to 4 bytes), offsets of the items into the id sequence,
+# the id sequence of all items and the hash index with item id + 1 per slot (0 marks an empty slot)
+magic = b'FIMI'
+version = 1
+header = struct.Struct('=4s6I')
+
+
+def pack_ids(ids):
+    """
+    Packs the interned ids of an item.
+    :param ids: sequence of property ids
+    :return: bytes of the ids
+    """
+    return array('I', ids).tobytes()
+
+
+def slot_of(packed, table_size):
+    """
+    Computes the first slot of an item in the hash index, independent of the Python version and process.
+    :param packed: the packed ids of the item
+    :param table_size: number of slots, a power of two
+    :return: the slot
+    """
+    return zlib.crc32(packed) & (table_size - 1)
+
+
+def write_item_database(item_dict, path):
+    """
+    Writes the item database in the binary format. The properties are interned to integers in order of their first
+    occurrence and every item is stored as packed id sequence.
+    :param item_dict: dict of FIMI tuple -> item id, the ids are 0 to len(item_dict) - 1
+    :param path: the output file, for example items.bin
+    :return:
+    """
+    items = sorted(item_dict.items(), key=lambda item: item[1])
+    if [item_id for _, item_id in items] != list(range(len(items))):
+        raise ValueError('The item ids are not 0 to ' + str(len(items) - 1))
+    names = dict()
+    offsets = array('I', [0])
+    ids = array('I')
+    for fimi_tuple, _ in items:
+        for name in fimi_tuple:
+            ids.append(names.setdefault(name, len(names)))
+        offsets.append(len(ids))
+    # the hash index is at most half full, so the probe sequences stay short
+    table_size = 1
+    while table_size < 2 * len(items):
+        table_size *= 2
+    table = array('I', bytes(4 * table_size))
+    ids_bytes = ids.tobytes()
+    for item_id in range(len(items)):
+        slot = slot_of(ids_bytes[4 * offsets[item_id]:4 * offsets[item_id + 1]], table_size)
+        while table[slot] != 0:
+            slot = (slot + 1) & (table_size - 1)
+        table[slot] = item_id + 1
+    names_bytes = '\n'.join(names).encode('utf-8')
+    names_bytes += bytes(-len(names_bytes) % 4)
+    with open(path, 'wb') as file:
+        file.write(header.pack(magic, version, len(names), len(items), len(ids), table_size, len(names_bytes)))
+        file.write(names_bytes)
+        file.write(offsets.tobytes())
+        file.write(ids_bytes)
+        file.write(table.tobytes())
+
+
+class ItemDatabase:
+    """
+    Read only view of a binary item database, which is memory mapped instead of parsed. Supports the lookups of a dict
+    of FIMI tuple -> item id.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the binary item database, for example items.bin
+        """
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        file_magic, file_version, n_names, n_items, n_ids, self.table_size, names_size = header.unpack_from(view)
+        if file_magic != magic or file_version != version:
+            raise ValueError('No binary item database of version ' + str(version) + ':\t' + str(path))
+        start = header.size
+        self.names = bytes(view[start:start + names_size]).rstrip(b'\0').decode('utf-8').split('\n')[:n_names]
+        self.name_ids = {name: name_id for name_id, name in enumerate(self.names)}
+        start += names_size
+        self.offsets = view[start:start + 4 * (n_items + 1)].cast('I')
+        start += 4 * (n_items + 1)
+        self.ids_bytes = view[start:start + 4 * n_ids]
+        self.ids = self.ids_bytes.cast('I')
+        start += 4 * n_ids
+        self.table = view[start:start + 4 * self.table_size].cast('I')
+        self.n_items = n_items
+
+    def get(self, fimi_tuple, default=None):
+        """
+        Looks up the id of an item.
+        :param fimi_tuple: tuple of property and sorted qualifiers
+        :param default: returned if the tuple is no item
+        :return: the item id
+        """
+        ids = []
+        for name in fimi_tuple:
+            name_id = self.name_ids.get(name)
+            if name_id is None:
+                return default
+            ids.append(name_id)
+        packed = pack_ids(ids)
+        slot = slot_of(packed, self.table_size)
+        entry = self.table[slot]
+        while entry != 0:
+            item_id = entry - 1
+            if self.ids_bytes[4 * self.offsets[item_id]:4 * self.offsets[item_id + 1]] == packed:
+                return item_id
+            slot = (slot + 1) & (self.table_size - 1)
+            entry = self.table[slot]
+        return default
+
+    def __getitem__(self, fimi_tuple):
+        item_id = self.get(fimi_tuple)
+        if item_id is None:
+            raise KeyError(fimi_tuple)
+        return item_id
+
+    def __contains__(self, fimi_tuple):
+        return self.get(fimi_tuple) is not None
+
+    def __len__(self):
+        return self.n_items
+
+    def item(self, item_id):
+        """
+        Returns the FIMI tuple of an item id.
+        :param item_id: the item id
+        :return: tuple of property and sorted qualifiers
+        """
+        return tuple(self.names[name_id] for name_id in self.ids[self.offsets[item_id]:self.offsets[item_id + 1]])
+
+    def items(self):
+        """
+        Iterates over all items in order of their ids.
+        :return: generator of (FIMI tuple, item id)
+        """
+        for item_id in range(self.n_items):
+            yield self.item(item_id), item_id
+
+    def close(self):
+        """
+        Releases the memory map.
+        """
+        for view in (self.offsets, self.ids, self.ids_bytes, self.table):
+            view.release()
+        self.map.close()
+        self.file.close()
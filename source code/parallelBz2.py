@@ -0,0 +1,201 @@
+import bz2
+import io
+import os
+from collections import deque
+from contextlib import nullcontext
+from multiprocessing import Pool
+
+# 48 bit magic numbers of the bzip2 format, blocks and the end of stream are not byte aligned
+block_magic = 0x314159265359
+eos_magic = 0x177245385090
+magic_mask = (1 << 48) - 1
+read_size = 8 * 1024 * 1024
+
+
+def magic_patterns(magic):
+    """
+    Computes the byte patterns of a magic number for all 8 possible bit shifts.
+    :param magic: the 48 bit magic number
+    :return: list of (shift, fully determined bytes, offset of these bytes in the 7 byte window)
+    """
+    patterns = []
+    for shift in range(8):
+        window = (magic << (8 - shift)).to_bytes(7, 'big')
+        if shift == 0:
+            patterns.append((shift, window[0:6], 0))
+        else:
+            patterns.append((shift, window[1:6], 1))
+    return patterns
+
+
+block_patterns = magic_patterns(block_magic)
+eos_patterns = magic_patterns(eos_magic)
+
+
+def find_boundaries(buf, search_from):
+    """
+    Finds all block and end of stream magic numbers in a buffer of the compressed file.
+    Only windows which completely fit into the buffer are checked.
+    :param buf: bytes of the compressed file
+    :param search_from: the first window start (byte index) to check
+    :return: sorted list of (bit position, is_block)
+    """
+    boundaries = []
+    last_window = len(buf) - 7
+    for magic, patterns, is_block in ((block_magic, block_patterns, True), (eos_magic, eos_patterns, False)):
+        for shift, pattern, offset in patterns:
+            index = buf.find(pattern, search_from + offset)
+            while index != -1 and index - offset <= last_window:
+                window = index - offset
+                if (int.from_bytes(buf[window:window + 7], 'big') >> (8 - shift)) & magic_mask == magic:
+                    boundaries.append((window * 8 + shift, is_block))
+                index = buf.find(pattern, index + 1)
+    boundaries.sort()
+    return boundaries
+
+
+def segment_value(segment):
+    """
+    Extracts the bits of a segment as integer.
+    :param segment: tuple of (bytes, bit offset in the first byte, bit length, is_block)
+    :return: integer holding exactly the bits of the segment
+    """
+    data, shift, nbits = segment[:3]
+    value = int.from_bytes(data, 'big') >> (len(data) * 8 - shift - nbits)
+    return value & ((1 << nbits) - 1)
+
+
+def merge_segments(first, second):
+    """
+    Concatenates two neighbouring segments, needed if a magic number was found by chance inside of a block.
+    :param first: the first segment
+    :param second: the segment following the first one
+    :return: the merged segment
+    """
+    nbits = first[2] + second[2]
+    value = (segment_value(first) << second[2]) | segment_value(second)
+    pad = -nbits % 8
+    return (value << pad).to_bytes((nbits + pad) // 8, 'big'), 0, nbits, first[3]
+
+
+def read_segments(source_file):
+    """
+    Reads the compressed file and splits it at the block boundaries.
+    :param source_file: the .bz2 file
+    :return: generator of segments (bytes, bit offset in the first byte, bit length, is_block)
+    """
+    with open(source_file, 'rb') as file:
+        buf = file.read(read_size)
+        if not buf.startswith(b'BZh'):
+            raise OSError('Invalid data stream')
+        search_from = 0
+        # bit position and kind of the last boundary found
+        last = None
+        while True:
+            chunk = file.read(read_size)
+            if chunk:
+                buf += chunk
+            else:
+                # the end of stream marker is followed by the crc and padding, which makes the last windows complete
+                buf += bytes(7)
+            for position, is_block in find_boundaries(buf, search_from):
+                if last is not None:
+                    yield buf[last[0] // 8:(position + 7) // 8], last[0] % 8, position - last[0], last[1]
+                last = (position, is_block)
+            search_from = max(search_from, len(buf) - 6)
+            if not chunk:
+                break
+            # keep only the data of the unfinished segment
+            trim = search_from if last is None else min(last[0] // 8, search_from)
+            buf = buf[trim:]
+            search_from -= trim
+            if last is not None:
+                last = (last[0] - trim * 8, last[1])
+        if last is not None and last[1]:
+            # the file ended without an end of stream marker, the decompression of this segment fails
+            yield buf[last[0] // 8:len(buf) - 7], last[0] % 8, (len(buf) - 7) * 8 - last[0], last[1]
+
+
+def decompress_segment(segment):
+    """
+    Decompresses a single block by wrapping it into a standalone bzip2 stream.
+    :param segment: the block segment
+    :return: the decompressed data, b'' for segments between streams or None if the segment is no valid block
+    """
+    if not segment[3]:
+        return b''
+    nbits = segment[2]
+    if nbits < 80:
+        return None
+    value = segment_value(segment)
+    # the combined crc of a stream with a single block is the block crc following the block magic
+    crc = (value >> (nbits - 80)) & 0xffffffff
+    pad = -(nbits + 80) % 8
+    stream = ((((value << 48) | eos_magic) << 32 | crc) << pad).to_bytes((nbits + 80 + pad) // 8, 'big')
+    try:
+        return bz2.decompress(b'BZh9' + stream)
+    except (OSError, ValueError, EOFError):
+        return None
+
+
+def next_block(pending, segments):
+    """
+    Receives the next decompressed block in the original order. Segments which are no valid block are merged with the
+    following segments and decompressed again.
+    :param pending: deque of (segment, async result) in file order
+    :param segments: the generator of not yet submitted segments
+    :return: the decompressed data
+    """
+    segment, result = pending.popleft()
+    data = result.get()
+    while data is None:
+        if pending:
+            following = pending.popleft()[0]
+        else:
+            following = next(segments, None)
+        if following is None:
+            raise OSError('Invalid data stream')
+        segment = merge_segments(segment, following)
+        data = decompress_segment(segment)
+    return data
+
+
+def read_lines(source_file, processes=None, binary=False, encoding='utf-8', pool=None):
+    """
+    Reads a .bz2 file line by line while its blocks are decompressed in parallel by a pool of worker processes.
+    The lines are returned in the original order like iterating over bz2.open(source_file, 'rt').
+    :param source_file: File Path of .bz2 file
+    :param processes: number of worker processes, all cores if None
+    :param binary: return lines as bytes instead of str
+    :param encoding: the encoding of the text lines
+    :param pool: the pool of worker processes, for example one created before any thread was started, a pool is
+    created when the lines are read first if None
+    :return: generator of lines
+    """
+    processes = processes or os.cpu_count()
+    segments = read_segments(source_file)
+    pending = deque()
+    carry = b''
+    with nullcontext(pool) if pool is not None else Pool(processes) as pool:
+        while True:
+            # keep every worker busy while the lines of the oldest block are consumed
+            while len(pending) < processes * 4:
+                segment = next(segments, None)
+                if segment is None:
+                    break
+                pending.append((segment, pool.apply_async(decompress_segment, (segment,))))
+            if not pending:
+                break
+            data = next_block(pending, segments)
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                carry += data
+                continue
+            lines = carry + data[:end]
+            carry = data[end:]
+            if binary:
+                yield from io.BytesIO(lines)
+            else:
+                yield from io.StringIO(lines.decode(encoding), newline=None)
+    if carry:
+        yield carry if binary else carry.decode(encoding)
@@ -0,0 +1,103 @@
+import json
+import os
+
+# the pattern sets which can be filtered from all frequent itemsets
+pattern_modes = ('closed', 'maximal')
+
+
+def read_patterns(pattern_file):
+    """
+    Reads the frequent itemsets in the format of Dist-Eclat, every line holds the items followed by the support in
+    brackets.
+    :param pattern_file: the output of Dist-Eclat or eclat, for example out.txt
+    :return: list of (tuple of items, support) in the order of the file
+    """
+    patterns = []
+    with open(pattern_file, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) != 0:
+                patterns.append((tuple(sorted(parts[:-1])), int(parts[-1][1:-1])))
+    return patterns
+
+
+def pattern_key(items, support):
+    """
+    Formats a pattern like the keys of supportingItemsPerPattern.json.
+    :param items: the items of the pattern
+    :param support: the support of the pattern
+    :return: the items sorted as strings followed by the support in brackets
+    """
+    return ' '.join(sorted(items)) + " (" + str(support) + ")"
+
+
+def find_supersets(patterns):
+    """
+    Finds the proper supersets of every pattern within the patterns, by intersecting the pattern lists of its items.
+    :param patterns: list of (tuple of items, support)
+    :return: list of sets of pattern indices
+    """
+    item_patterns = dict()
+    for index, (items, _) in enumerate(patterns):
+        for item in items:
+            item_patterns.setdefault(item, set()).add(index)
+    supersets = []
+    for index, (items, _) in enumerate(patterns):
+        postings = sorted((item_patterns[item] for item in items), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        candidates.discard(index)
+        supersets.append(candidates)
+    return supersets
+
+
+def filter_patterns(patterns, mode):
+    """
+    Keeps the closed or the maximal patterns. A pattern is closed if no superset has the same support, and maximal if
+    it has no superset at all. The mapping leads every pattern to the kept patterns which represent it: the closed
+    pattern with the same support, which has the same supporting items, or the maximal patterns containing it.
+    :param patterns: list of (tuple of items, support)
+    :param mode: one of pattern_modes
+    :return: tuple of (list of the kept patterns, dict of pattern key -> list of the keys of its representatives)
+    """
+    if mode not in pattern_modes:
+        raise ValueError('Unknown pattern set ' + str(mode) + ', choose one of ' + str(pattern_modes))
+    supersets = find_supersets(patterns)
+    if mode == 'closed':
+        kept = [len([other for other in candidates if patterns[other][1] == patterns[index][1]]) == 0 for
+                index, candidates in enumerate(supersets)]
+    else:
+        kept = [len(candidates) == 0 for candidates in supersets]
+    mapping = dict()
+    for index, (items, support) in enumerate(patterns):
+        if kept[index]:
+            representatives = [index]
+        elif mode == 'closed':
+            # the closure is the largest superset with the same support
+            representatives = [max((other for other in supersets[index] if patterns[other][1] == support),
+                                   key=lambda other: (len(patterns[other][0]), patterns[other][0]))]
+        else:
+            representatives = sorted(other for other in supersets[index] if kept[other])
+        mapping[pattern_key(items, support)] = [pattern_key(*patterns[other]) for other in representatives]
+    return [pattern for index, pattern in enumerate(patterns) if kept[index]], mapping
+
+
+def filter_pattern_file(pattern_file, mode):
+    """
+    Writes the closed or maximal patterns of a pattern file next to it, together with the mapping of all patterns to
+    their representatives.
+    :param pattern_file: the output of Dist-Eclat or eclat, for example out.txt
+    :param mode: one of pattern_modes
+    :return: tuple of the paths of the filtered pattern file and the mapping
+    """
+    patterns = read_patterns(pattern_file)
+    kept, mapping = filter_patterns(patterns, mode)
+    base = os.path.splitext(pattern_file)[0]
+    filtered_file = base + '_' + mode + '.txt'
+    mapping_file = base + '_' + mode + '_mapping.json'
+    with open(filtered_file, 'w') as file:
+        for items, support in kept:
+            file.write(pattern_key(items, support) + "\n")
+    with open(mapping_file, 'w') as file:
+        json.dump(mapping, file)
+    print("Patterns:\t", len(patterns), "\t", mode + ":\t", len(kept))
+    return filtered_file, mapping_file
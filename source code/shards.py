@@ -0,0 +1,184 @@
+import bz2
+import gzip
+import json
+import os
+
+# optional codecs, only usable if the packages are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+codec_extensions = {'none': '', 'bz2': '.bz2', 'gzip': '.gz', 'zstd': '.zst', 'lz4': '.lz4'}
+codec_magics = ((b'BZh', 'bz2'), (b'\x1f\x8b', 'gzip'), (b'\x28\xb5\x2f\xfd', 'zstd'), (b'\x04\x22\x4d\x18', 'lz4'))
+size_units = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+manifest_name = 'manifest.json'
+
+
+def available_codecs():
+    """
+    Lists the codecs which can be used with the installed packages.
+    :return: list of codec names
+    """
+    return [codec for codec in codec_extensions if
+            (codec != 'zstd' or zstandard is not None) and (codec != 'lz4' or lz4 is not None)]
+
+
+def detect_codec(path):
+    """
+    Detects the codec of a shard by its magic bytes.
+    :param path: the shard file
+    :return: the codec name
+    """
+    with open(path, 'rb') as file:
+        head = file.read(4)
+    for magic, codec in codec_magics:
+        if head.startswith(magic):
+            return codec
+    return 'none'
+
+
+def open_shard(path, mode='rt', codec=None, level=None):
+    """
+    Opens a shard for reading or writing. The codec of a shard which is read is detected automatically.
+    :param path: the shard file
+    :param mode: one of 'rt', 'rb', 'wt', 'wb'
+    :param codec: the codec for writing, detected if None
+    :param level: the compression level, the default of the codec if None
+    :return: file object
+    """
+    if codec is None:
+        codec = detect_codec(path) if 'r' in mode else 'none'
+    if codec not in available_codecs():
+        raise ValueError('Codec ' + str(codec) + ' is not available, choose one of ' + str(available_codecs()))
+    encoding = None if 'b' in mode else 'utf-8'
+    if codec == 'none':
+        return open(path, mode, encoding=encoding)
+    elif codec == 'bz2':
+        return bz2.open(path, mode, compresslevel=level or 9, encoding=encoding)
+    elif codec == 'gzip':
+        return gzip.open(path, mode, compresslevel=6 if level is None else level, encoding=encoding)
+    elif codec == 'zstd':
+        if 'w' in mode:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=level or 3), encoding=encoding)
+        return zstandard.open(path, mode, encoding=encoding)
+    else:
+        return lz4.frame.open(path, mode, compression_level=level or 0, encoding=encoding)
+
+
+def parse_shard_size(text):
+    """
+    Parses the size of a shard, given as number of lines or as bytes with a unit.
+    :param text: for example '10000000' for lines or '2GB' for bytes
+    :return: tuple of (lines, bytes), one of them is None
+    """
+    text = text.strip().upper().replace(' ', '')
+    for unit in sorted(size_units, key=len, reverse=True):
+        if text.endswith(unit) and text[:-len(unit)].replace('.', '', 1).isdigit():
+            return None, int(float(text[:-len(unit)]) * size_units[unit])
+    return int(text), None
+
+
+def list_shards(input_path):
+    """
+    Lists the shards of a directory in their order. Uses the manifest if there is one, otherwise all files sorted by
+    name.
+    :param input_path: the directory of the shards
+    :return: list of file paths
+    """
+    manifest_path = os.path.join(input_path, manifest_name)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        return [os.path.join(input_path, shard['file']) for shard in manifest['shards']]
+    file_list = sorted(next(os.walk(input_path))[2])
+    return [os.path.join(input_path, file) for file in file_list]
+
+
+class ShardWriter:
+    """
+    Writes lines into numbered shards, which are cut after a number of lines or uncompressed bytes, and lists them in
+    a manifest. The size of text lines is counted in UTF-8 bytes, like the files are written.
+    """
+
+    def __init__(self, dest_folder, dest_file, codec='bz2', level=None, shard_lines=10000000, shard_bytes=None,
+                 binary=False):
+        """
+        :param dest_folder: Directory for the shards and the manifest
+        :param dest_file: File name of the shards, a compression extension is replaced by the one of the codec
+        :param codec: one of codec_extensions
+        :param level: the compression level, the default of the codec if None
+        :param shard_lines: maximum number of lines per shard, no limit if None
+        :param shard_bytes: maximum number of uncompressed bytes per shard, no limit if None
+        :param binary: the lines are bytes
+        """
+        if codec not in available_codecs():
+            raise ValueError('Codec ' + str(codec) + ' is not available, choose one of ' + str(available_codecs()))
+        for extension in codec_extensions.values():
+            if extension and dest_file.endswith(extension):
+                dest_file = dest_file[:-len(extension)]
+        self.dest_folder = dest_folder
+        self.dest_file = dest_file + codec_extensions[codec]
+        self.codec = codec
+        self.level = level
+        self.shard_lines = shard_lines
+        self.shard_bytes = shard_bytes
+        self.binary = binary
+        self.mode = 'wb' if binary else 'wt'
+        self.shards = []
+        self.file = None
+        self.lines = 0
+        self.size = 0
+
+    def open_next(self):
+        """
+        Opens the next shard.
+        """
+        name = f'{len(self.shards):04}' + "-" + self.dest_file
+        print("Output file:\t", os.path.join(self.dest_folder, name))
+        self.file = open_shard(os.path.join(self.dest_folder, name), self.mode, self.codec, self.level)
+        self.shards.append({'file': name, 'lines': 0, 'bytes': 0})
+        self.lines = 0
+        self.size = 0
+
+    def close_current(self):
+        """
+        Closes the current shard and records its line count and file size.
+        """
+        self.file.close()
+        self.file = None
+        shard = self.shards[-1]
+        shard['lines'] = self.lines
+        shard['bytes'] = os.path.getsize(os.path.join(self.dest_folder, shard['file']))
+
+    def write(self, line):
+        """
+        Writes a line and cuts the shard if it is full. The next shard is opened with the next line, so there are no
+        empty shards.
+        :param line: the line to write
+        """
+        if self.file is None:
+            self.open_next()
+        self.file.write(line)
+        self.lines += 1
+        # an ASCII line has one byte per character, only other lines are encoded to count their bytes
+        self.size += len(line) if self.binary or line.isascii() else len(line.encode())
+        if (self.shard_lines is not None and self.lines >= self.shard_lines) or (
+                self.shard_bytes is not None and self.size >= self.shard_bytes):
+            self.close_current()
+
+    def close(self):
+        """
+        Closes the last shard and writes the manifest.
+        :return: the manifest
+        """
+        if self.file is not None:
+            self.close_current()
+        manifest = {'codec': self.codec, 'level': self.level, 'shards': self.shards}
+        with open(os.path.join(self.dest_folder, manifest_name), 'w') as file:
+            json.dump(manifest, file, indent=1)
+        return manifest
@@ -0,0 +1,258 @@
+import asyncio
+import http.client
+import json
+import logging
+import re
+import time
+import urllib.parse
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+# the endpoint, the requests it may receive and the user agent, which the Wikimedia policy asks to identify the tool
+endpoint_url = 'https://query.wikidata.org/sparql'
+concurrency = 4
+requests_per_second = 5.0
+user_agent = 'WikidataMetadataPatterns (https://github.com/lukasmuell3r/WikidataMetadataPatterns) Python/http.client'
+# the VALUES batches start with batch_size items and are resized so that a response takes about target_seconds
+batch_size = 300
+min_batch_size = 10
+max_batch_size = 2000
+target_seconds = 10.0
+timeout = 120
+retries = 8
+
+re_wd = re.compile('^http:\/\/www\.wikidata\.org\/entity\/')
+
+
+class SparqlError(Exception):
+    """
+    Raised if a batch still fails after all retries or is rejected by the endpoint.
+    """
+    pass
+
+
+class TokenBucket:
+    """
+    Rate limiter which allows a burst of requests and refills with a constant rate. The endpoint can pause all
+    requests, for example with a Retry-After header.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: requests per second
+        :param burst: maximum number of requests at once, the rate rounded up if None
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate + 0.999))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        """
+        Pauses all requests.
+        :param seconds: the pause from now on
+        :return:
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """
+        Waits until a request may be sent. The tokens are checked and taken without awaiting in between, so the tasks
+        of the event loop do not need a lock.
+        """
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_after(value):
+    """
+    Parses a Retry-After header.
+    :param value: the header, seconds or a HTTP date
+    :return: the seconds to wait, None if the header is missing or invalid
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def instances_query(items):
+    """
+    Builds the query of the P31 classes of some items.
+    :param items: list of Wikidata items, for example ['Q42']
+    :return: the SPARQL query
+    """
+    return ('PREFIX wd: <http://www.wikidata.org/entity/>\n'
+            'PREFIX wdt: <http://www.wikidata.org/prop/direct/>\n'
+            'SELECT ?item ?o WHERE { VALUES ?item { ' + ' '.join('wd:' + item for item in items) +
+            ' } ?item wdt:P31 ?o . }')
+
+
+def parse_instances(results, items):
+    """
+    Reads the P31 classes from the results of instances_query.
+    :param results: the SPARQL JSON results
+    :param items: the queried items
+    :return: dict of item -> list of classes, for every queried item, empty if it has no class
+    """
+    instances = {item: [] for item in items}
+    for binding in results['results']['bindings']:
+        item = re.sub(re_wd, '', binding['item']['value']).upper()
+        if item in instances and re.match(re_wd, binding['o']['value']):
+            instances[item].append(re.sub(re_wd, '', binding['o']['value']).upper())
+    return instances
+
+
+class SparqlClient:
+    """
+    Client of a SPARQL endpoint, which sends up to concurrency requests at once over a pool of persistent connections,
+    limits the rate with a token bucket, honors Retry-After and resizes the VALUES batches from the response times.
+    The connections are blocking http.client connections, which the asyncio tasks use in threads, so the client works
+    across several asyncio.run calls.
+    """
+
+    def __init__(self, endpoint=endpoint_url, concurrency=concurrency, rate=requests_per_second):
+        """
+        :param endpoint: the URL of the SPARQL endpoint
+        :param concurrency: maximum number of requests at once
+        :param rate: maximum number of requests per second
+        """
+        self.endpoint = endpoint
+        self.url = urllib.parse.urlsplit(endpoint)
+        self.path = self.url.path + ('?' + self.url.query if self.url.query else '')
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate)
+        self.batch_size = batch_size
+        self.idle = []
+        self.requests = 0
+
+    def connection(self):
+        """
+        :return: an idle connection of the pool or a new one
+        """
+        if self.idle:
+            return self.idle.pop()
+        if self.url.scheme == 'https':
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port, timeout=timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=timeout)
+
+    def post(self, connection, query):
+        """
+        Sends a query, runs in a thread.
+        :param connection: the connection of the pool
+        :param query: the SPARQL query
+        :return: tuple of (status, headers, body)
+        """
+        connection.request('POST', self.path, body=urllib.parse.urlencode({'query': query}),
+                           headers={'Accept': 'application/sparql-results+json', 'User-Agent': user_agent,
+                                    'Content-Type': 'application/x-www-form-urlencoded'})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+
+    async def request(self, query):
+        """
+        Performs a query once.
+        :param query: the SPARQL query
+        :return: tuple of (JSON results or None, status or None, seconds to wait before a retry or None, response
+        time)
+        """
+        await self.bucket.acquire()
+        connection = self.connection()
+        self.requests += 1
+        start = time.monotonic()
+        try:
+            status, headers, body = await asyncio.to_thread(self.post, connection, query)
+        except (OSError, http.client.HTTPException) as e:
+            logging.warning('Request failed:\t%s', repr(e))
+            connection.close()
+            return None, None, None, time.monotonic() - start
+        seconds = time.monotonic() - start
+        self.idle.append(connection)
+        if status == 200:
+            return json.loads(body), status, None, seconds
+        wait = retry_after(headers.get('Retry-After'))
+        logging.warning('Endpoint answered with status %s, Retry-After:\t%s', status, headers.get('Retry-After'))
+        return None, status, wait, seconds
+
+    def resize(self, seconds, size):
+        """
+        Resizes the batches after a response, so that a response takes about target_seconds.
+        :param seconds: the response time
+        :param size: the size of the answered batch
+        :return:
+        """
+        if seconds < target_seconds / 2 and size >= self.batch_size:
+            self.batch_size = min(max_batch_size, self.batch_size * 3 // 2)
+        elif seconds > target_seconds:
+            self.batch_size = max(min_batch_size, self.batch_size // 2)
+
+    async def fetch_instances(self, items, on_batch):
+        """
+        Queries the P31 classes of the items in batches with concurrency workers.
+        :param items: list of Wikidata items
+        :param on_batch: called with the dict of item -> list of classes of every answered batch, or None
+        :return: dict of item -> list of classes
+        """
+        pending = deque(items)
+        instances = dict()
+
+        async def work():
+            attempt = 0
+            while pending:
+                size = min(self.batch_size, len(pending))
+                batch = [pending.popleft() for _ in range(size)]
+                results, status, wait, seconds = await self.request(instances_query(batch))
+                if results is None:
+                    if status is not None and 400 <= status < 500 and status not in (413, 414, 429):
+                        raise SparqlError('Query rejected with status ' + str(status))
+                    attempt += 1
+                    if attempt == retries:
+                        raise SparqlError('Query failed ' + str(retries) + ' times')
+                    if status != 429:
+                        # timeouts and server errors are retried with smaller batches
+                        self.batch_size = max(min_batch_size, min(self.batch_size, len(batch)) // 2)
+                    pending.extendleft(reversed(batch))
+                    self.bucket.pause(wait if wait is not None else min(60, 2 ** attempt))
+                    continue
+                attempt = 0
+                self.resize(seconds, len(batch))
+                batch_instances = parse_instances(results, batch)
+                instances.update(batch_instances)
+                if on_batch is not None:
+                    on_batch(batch_instances)
+
+        await asyncio.gather(*(work() for _ in range(self.concurrency)))
+        return instances
+
+    def instances(self, items, on_batch=None):
+        """
+        Queries the P31 classes of items.
+        :param items: list of Wikidata items, for example ['Q42']
+        :param on_batch: called with the dict of item -> list of classes of every answered batch, for example to cache
+        them, or None
+        :return: dict of item -> list of classes, for every item, empty if it has no class
+        """
+        if len(items) == 0:
+            return dict()
+        return asyncio.run(self.fetch_instances(list(dict.fromkeys(items)), on_batch))
+
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
@@ -0,0 +1,93 @@
+import csv
+import re
+from collections import Counter
+
+import shards
+
+# matches the property lines <wd:Q> <p:P> <wds:Q-...> and the qualifier lines <wds:Q-...> <pq:P> of the cleaned dump,
+# all other lines do not match
+line_pattern = re.compile('<(wds?):([^>]+)> <(pq?):([^>]+)> (?:<wds:([^>]+)>)?')
+
+
+def parse_statements(lines, statement, head=None):
+    """
+    Groups the lines of the cleaned dump into statements, every line is matched once. A statement starts with the
+    property line of an item and collects the qualifiers of the following lines of its statement node.
+    :param lines: iterable of lines of the cleaned dump
+    :param statement: list of [entity, statement node, property, qualifier set] of the unfinished statement, entity is
+     None if there is none; the list is updated in place, so the parsing can continue with the next lines
+    :param head: list receiving (statement node, qualifier) of the qualifier lines before the first statement starts,
+     these lines belong to the unfinished statement of previous lines; ignored if None
+    :return: generator of finished statements (entity, statement node, property, qualifier set)
+    """
+    in_head = head is not None
+    for line in lines:
+        match = line_pattern.match(line)
+        if match is None:
+            continue
+        kind, subject, predicate, name, node = match.groups()
+        if kind == 'wd':
+            if predicate != 'p' or node is None:
+                continue
+            in_head = False
+            if statement[0] is not None:
+                yield tuple(statement)
+            if subject[:1] in ('Q', 'q') and node[:1] in ('Q', 'q'):
+                statement[:] = [subject.upper(), node.upper(), name.upper(), set()]
+            else:
+                # statements of properties and lexemes are no part of the item database
+                statement[:] = [None, None, None, set()]
+        elif predicate == 'pq':
+            if in_head:
+                head.append((subject.upper(), name.upper()))
+            elif statement[0] is not None and subject.upper() == statement[1]:
+                statement[3].add(name.upper())
+
+
+def read_statements(files):
+    """
+    Reads the shards of the cleaned dump and yields their statements, statements crossing a shard boundary are
+    continued in the next shard.
+    :param files: the shards in their order
+    :return: generator of statements (entity, statement node, property, qualifier set)
+    """
+    statement = [None, None, None, set()]
+    for filename in files:
+        print("File:\t", filename)
+        # the codec of the shard is detected automatically
+        stream = shards.open_shard(filename, 'rt')
+        yield from parse_statements(stream, statement)
+        stream.close()
+    if statement[0] is not None:
+        yield tuple(statement)
+
+
+def read_excluded_properties(ext_ident_path):
+    """
+    Reads the external identifiers and returns the properties whose items are skipped.
+    :param ext_ident_path: The path to the external identifiers file.
+    :return: set of properties
+    """
+    ext_identifiers = []
+    with open(ext_ident_path, newline='') as external_identifier_csv:
+        for row in csv.reader(external_identifier_csv):
+            ext_identifiers.append(row[0])
+    # an external identifier is skipped if it is listed exactly once, like ext_identifiers.count(temp_prop) == 1
+    excluded = {identifier for identifier, count in Counter(ext_identifiers).items() if count == 1}
+    # properties P3921 and P4316 contain sparql queries as values and destroy the database format, they are skipped
+    excluded.update(('P3921', 'P4316'))
+    # the P31 and P279 statements form the class hierarchy and are no items
+    excluded.update(('P31', 'P279'))
+    return excluded
+
+
+def fimi_item(statement, excluded):
+    """
+    Constructs the FIMI tuple of a statement, which is an item of the database if it has at least one qualifier.
+    :param statement: tuple of (entity, statement node, property, qualifier set)
+    :param excluded: set of properties whose items are skipped
+    :return: tuple of property and sorted qualifiers, None if the statement is no item
+    """
+    if len(statement[3]) == 0 or statement[2] in excluded:
+        return None
+    return tuple([statement[2]] + list(sorted(statement[3])))
@@ -0,0 +1,76 @@
+import json
+
+# the compact format has one JSON object per line and pattern, the Wikidata items are stored as differences of their
+# numeric ids in the order of the transactions, which are mostly small since the dump is ordered by id
+jsonl_name = 'supportingItemsPerPattern.jsonl'
+
+
+def encode_items(wd_items):
+    """
+    Delta encodes the numeric ids of Wikidata items.
+    :param wd_items: list of Wikidata items, for example ['Q42', 'Q64']
+    :return: list of the differences of the numeric ids, starting with the first id
+    """
+    deltas = []
+    previous = 0
+    for wd_item in wd_items:
+        number = int(wd_item[1:])
+        deltas.append(number - previous)
+        previous = number
+    return deltas
+
+
+def decode_items(deltas):
+    """
+    Decodes delta encoded numeric ids of Wikidata items.
+    :param deltas: list of the differences of the numeric ids
+    :return: list of Wikidata items
+    """
+    wd_items = []
+    number = 0
+    for delta in deltas:
+        number += delta
+        wd_items.append('Q' + str(number))
+    return wd_items
+
+
+class SupportingItemsWriter:
+    """
+    Streams the supporting items of the patterns into the compact format, one pattern at a time.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the output file, for example supportingItemsPerPattern.jsonl
+        """
+        self.file = open(path, 'w')
+
+    def write(self, key, wd_items):
+        """
+        Writes the supporting items of a pattern.
+        :param key: the pattern with its support, for example '124 13 1360 (368)'
+        :param wd_items: list of the supporting Wikidata items
+        :return:
+        """
+        self.file.write(json.dumps({'pattern': key, 'deltas': encode_items(wd_items)}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def read_supporting_items(path):
+    """
+    Reads the supporting items of the patterns lazily, so only one pattern is in memory at a time. A .json file of
+    the previous format is loaded at once.
+    :param path: supportingItemsPerPattern.jsonl or supportingItemsPerPattern.json
+    :return: generator of (pattern with its support, list of the supporting Wikidata items)
+    """
+    if not path.endswith('.jsonl'):
+        with open(path, 'r') as file:
+            yield from json.load(file).items()
+        return
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record['pattern'], decode_items(record['deltas'])
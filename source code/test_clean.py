@@ -0,0 +1,139 @@
+import importlib.util
+import os
+import random
+
+import pytest
+
+# the numbered scripts cannot be imported by name
+spec = importlib.util.spec_from_file_location('cleanAndSplitDump',
+                                              os.path.join(os.path.dirname(__file__), '1_cleanAndSplitDump.py'))
+cleanAndSplitDump = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cleanAndSplitDump)
+
+W = 'http://www.wikidata.org/'
+statement = W + 'entity/statement/Q42-D8404CDA-56A1-4D35-B1A8-4C8EC2C6D3C6'
+
+# lines which are kept and shortened
+kept_lines = [
+    '<%sentity/Q42> <%sprop/P569> <%s> .\n' % (W, W, statement),
+    '<%sentity/P569> <%sprop/P569> <%s> .\n' % (W, W, statement),
+    '<%s> <%sprop/statement/P569> "+1952-03-11T00:00:00Z"^^<http://www.w3.org/2001/XMLSchema#dateTime> .\n' % (
+        statement, W),
+    '<%s> <%sprop/statement/P31> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/statement/P1082> "+3644826"^^<http://www.w3.org/2001/XMLSchema#decimal> .\n' % (statement, W),
+    '<%s> <%sprop/qualifier/P580> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/qualifier/P580> "+2001-05-11T00:00:00Z"^^<http://www.w3.org/2001/XMLSchema#dateTime> .\n' % (
+        statement, W),
+    '<%s> <%sprop/qualifier/P1545> "1" .\n' % (statement, W),
+    '<%s> <%sprop/statement/P1476> "The Hitchhiker\'s Guide"@en .\n' % (statement, W),
+    '<%s> <%sprop/statement/P569> "+1952-03-11T00:00:00Z"^^<http://www.w3.org/2001/XMLSchema#dateTime> .' % (
+        statement, W),
+]
+
+# lines which are dropped unchanged
+dropped_lines = [
+    '<%s> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://wikiba.se/ontology#Statement> .\n' % statement,
+    '<%s> <http://wikiba.se/ontology#rank> <http://wikiba.se/ontology#NormalRank> .\n' % statement,
+    '<%s> <http://www.w3.org/ns/prov#wasDerivedFrom> <%sreference/87d0dc1c7847f19ac0f19be978015dfb202cf59a> .\n' % (
+        statement, W),
+    '<%sreference/87d0dc1c7847f19ac0f19be978015dfb202cf59a> <%sprop/reference/P248> <%sentity/Q5375741> .\n' % (
+        W, W, W),
+    '<%s> <%sprop/statement/value/P569> <%svalue/1cbd6bd2a21af8f9a1d1da49c0ea1d73> .\n' % (statement, W, W),
+    '<%sentity/Q42> <%sprop/direct/P31> <%sentity/Q5> .\n' % (W, W, W),
+    '<%sentity/Q42> <http://www.w3.org/2000/01/rdf-schema#label> "Douglas Adams"@en .\n' % W,
+    '<%sentity/Q42> <http://schema.org/description> "English writer and humorist"@en .\n' % W,
+    '<https://en.wikipedia.org/wiki/Douglas_Adams> <http://schema.org/about> <%sentity/Q42> .\n' % W,
+    '<%svalue/1cbd6bd2a21af8f9a1d1da49c0ea1d73> <http://wikiba.se/ontology#timeValue> "1952-03-11T00:00:00Z"'
+    '^^<http://www.w3.org/2001/XMLSchema#dateTime> .\n' % W,
+    '<%sentity/Q42> <%sprop/P569> <%sentity/Q5> .\n' % (W, W, W),
+    '\n',
+    '',
+]
+
+# literals which contain wikidata IRIs and unusual predicates, the single pass cleaning gives most of them to clean_regex
+literal_lines = [
+    '<%s> <%sprop/statement/P854> "see %sentity/Q5 and %sprop/P31" .\n' % (statement, W, W, W),
+    '<%s> <%sprop/qualifier/P1545> "<%sentity/Q5> <%sprop/P31> <%s> ." .\n' % (statement, W, W, W, statement),
+    '<%sentity/Q42> <%sprop/direct/P856> "%sentity/statement/Q1" .\n' % (W, W, W),
+    '<%sentity/Q42> <http://schema.org/name> "%sentity/statement/Q1 <%sprop/P31>" .\n' % (W, W, W),
+    '<%s> <%sprop/statement/P2699> <%swiki/Special:EntityPage/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/qualifier/P580> wd:Q5 > .\n' % (statement, W),
+    '<%s> <%sprop/qualifier/P580/x> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/qualifier/> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/statement/vP1> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/qualifier/value-normalized/P580> <%sentity/Q5> .\n' % (statement, W, W),
+    '<%s> <%sprop/statement/value-normalized/P2048> "+1.96"^^<http://www.w3.org/2001/XMLSchema#decimal> .\n' % (
+        statement, W),
+]
+
+# lines whose wikidata IRIs have no known prefix, on which clean_regex raises a TypeError
+malformed_lines = [
+    '<%s> <%sprop/statement/P31> <http://wwwXwikidataXorg/entity/Q5> .\n' % (statement, W),
+    '<%s> <%sprop/statement/P31> <%sentity/direct/Q5> .\n' % (statement, W, W),
+]
+
+sample_lines = kept_lines + dropped_lines + literal_lines + malformed_lines
+
+
+def mutations(lines, count, seed=0):
+    """
+    Changes the sample lines at random positions, so the cases in between the samples are covered too.
+    :param lines: the sample lines
+    :param count: number of lines to generate
+    :param seed: the seed of the random generator
+    :return: list of the changed lines
+    """
+    rng = random.Random(seed)
+    pieces = ['<', '>', ' ', '"', '/', '.', '\n', '^^<', W, W + 'entity/', W + 'prop/qualifier/', 'http://www', 'x']
+    changed = []
+    for _ in range(count):
+        line = rng.choice(lines)
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randint(0, len(line))
+            if rng.random() < 0.5:
+                line = line[:position] + rng.choice(pieces) + line[position:]
+            else:
+                line = line[:position] + line[position + rng.randint(1, 3):]
+        changed.append(line)
+    return changed
+
+
+def outcome(function, line):
+    """
+    :param function: the cleaning function
+    :param line: the line to clean
+    :return: the cleaned line or the type of the raised exception
+    """
+    try:
+        return function(line)
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('line', sample_lines)
+def test_clean_equals_clean_regex(line):
+    assert outcome(cleanAndSplitDump.clean, line) == outcome(cleanAndSplitDump.clean_regex, line)
+
+
+@pytest.mark.parametrize('line', sample_lines)
+def test_clean_bytes_equals_clean_regex_bytes(line):
+    line = line.encode()
+    assert outcome(cleanAndSplitDump.clean_bytes, line) == outcome(cleanAndSplitDump.clean_regex_bytes, line)
+
+
+def test_samples_are_kept_and_dropped():
+    for line in kept_lines:
+        assert cleanAndSplitDump.clean(line) != line
+        assert '<wds:' in cleanAndSplitDump.clean(line) or '<wd:' in cleanAndSplitDump.clean(line)
+    for line in dropped_lines:
+        assert cleanAndSplitDump.clean(line) == line
+    for line in malformed_lines:
+        with pytest.raises(TypeError):
+            cleanAndSplitDump.clean_regex(line)
+
+
+def test_clean_equals_clean_regex_on_mutated_lines():
+    for line in mutations(sample_lines, 20000):
+        assert outcome(cleanAndSplitDump.clean, line) == outcome(cleanAndSplitDump.clean_regex, line), line
+        line = line.encode()
+        assert outcome(cleanAndSplitDump.clean_bytes, line) == outcome(cleanAndSplitDump.clean_regex_bytes, line), line
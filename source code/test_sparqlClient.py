@@ -0,0 +1,171 @@
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import sparqlClient
+
+W = 'http://www.wikidata.org/entity/'
+
+
+class StubEndpoint(ThreadingHTTPServer):
+    """
+    Local SPARQL endpoint which answers the P31 query of every item Qi with the class Q(i % 7) if i is not divisible by
+    3. The first requests can be answered with the given failures instead.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        # list of (status, headers) of the next requests, a request is answered normally when it is empty
+        self.failures = []
+        # number of items of every request, the time it arrived and its status
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.max_items = None
+        self.delay = 0.0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self.server_port) + '/sparql'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        query = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())['query'][0]
+        items = re.findall(r'wd:(Q\d+)', query)
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            if server.failures:
+                status, headers = server.failures.pop(0)
+            elif server.max_items is not None and len(items) > server.max_items:
+                status, headers = 500, dict()
+            else:
+                status, headers = 200, dict()
+            server.requests.append((len(items), time.monotonic(), status))
+        try:
+            time.sleep(server.delay)
+            body = b''
+            if status == 200:
+                bindings = [{'item': {'value': W + item}, 'o': {'value': W + 'Q' + str(int(item[1:]) % 7)}} for item in
+                            items if int(item[1:]) % 3]
+                body = json.dumps({'results': {'bindings': bindings}}).encode()
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def endpoint():
+    server = StubEndpoint()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def expected(items):
+    return {item: ['Q' + str(int(item[1:]) % 7)] if int(item[1:]) % 3 else [] for item in items}
+
+
+def test_instances(endpoint):
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=4, rate=100)
+    items = ['Q' + str(number) for number in range(1, 1001)]
+    batches = []
+    assert client.instances(items + ['Q5'], batches.append) == expected(items)
+    assert sorted(item for batch in batches for item in batch) == sorted(items)
+    assert client.instances([]) == dict()
+    client.close()
+
+
+def test_concurrency_is_limited(endpoint):
+    endpoint.delay = 0.05
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=2, rate=100)
+    client.batch_size = 10
+    client.instances(['Q' + str(number) for number in range(1, 201)])
+    assert endpoint.max_active <= 2
+    assert len(client.idle) <= 2
+    client.close()
+
+
+def test_retry_after_pauses_all_requests(endpoint):
+    endpoint.failures = [(429, {'Retry-After': '1'})]
+    endpoint.delay = 0.02
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=2, rate=100)
+    client.batch_size = 10
+    items = ['Q' + str(number) for number in range(1, 101)]
+    assert client.instances(items) == expected(items)
+    limited = endpoint.requests[0][1]
+    # a request of the other worker may already be on its way, after that both workers wait
+    assert not [arrival for _, arrival, _ in endpoint.requests if limited + 0.2 < arrival < limited + 0.9]
+    assert endpoint.requests[-1][1] - limited >= 0.9
+    client.close()
+
+
+def test_server_errors_split_the_batches(endpoint, monkeypatch):
+    monkeypatch.setattr(sparqlClient, 'min_batch_size', 5)
+    endpoint.max_items = 40
+    endpoint.failures = [(500, dict())]
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=1, rate=1000)
+    client.bucket.pause = lambda seconds: None
+    items = ['Q' + str(number) for number in range(1, 401)]
+    assert client.instances(items) == expected(items)
+    sizes = [size for size, _, _ in endpoint.requests]
+    assert sizes[:3] == [300, 150, 75]
+    assert max(size for size, _, status in endpoint.requests if status == 200) <= 40
+    client.close()
+
+
+def test_fast_responses_grow_the_batches(endpoint):
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=1, rate=1000)
+    client.batch_size = 10
+    client.instances(['Q' + str(number) for number in range(1, 201)])
+    sizes = [size for size, _, _ in endpoint.requests]
+    assert sizes[:4] == [10, 15, 22, 33]
+    client.close()
+
+
+def test_rejected_query_raises(endpoint):
+    endpoint.failures = [(400, dict())]
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=1, rate=1000)
+    with pytest.raises(sparqlClient.SparqlError):
+        client.instances(['Q1', 'Q2'])
+    assert len(endpoint.requests) == 1
+    client.close()
+
+
+def test_retries_are_limited(endpoint, monkeypatch):
+    monkeypatch.setattr(sparqlClient, 'retries', 3)
+    endpoint.failures = [(503, {'Retry-After': '0'})] * 10
+    client = sparqlClient.SparqlClient(endpoint.url, concurrency=1, rate=1000)
+    with pytest.raises(sparqlClient.SparqlError):
+        client.instances(['Q1', 'Q2'])
+    assert len(endpoint.requests) == 3
+    client.close()
+
+
+def test_retry_after():
+    assert sparqlClient.retry_after('2') == 2.0
+    assert sparqlClient.retry_after('-1') == 0.0
+    assert sparqlClient.retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert sparqlClient.retry_after('soon') is None
+    assert sparqlClient.retry_after(None) is None
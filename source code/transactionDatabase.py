@@ -0,0 +1,117 @@
+import io
+import os
+from array import array
+
+import numpy as np
+
+# the transaction database in compressed sparse row form: the items of transaction i are
+# items[offsets[i]:offsets[i + 1]] and entities[i] is the numeric id of its Wikidata item (42 for Q42)
+offsets_name = 'transaction_offsets.npy'
+items_name = 'transaction_items.npy'
+entities_name = 'transaction_entities.npy'
+buffer_size = 1 << 20
+
+
+def npy_header(dtype, length):
+    """
+    :param dtype: the dtype of a one dimensional array
+    :param length: the length of the array
+    :return: the .npy header of the array
+    """
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                  'fortran_order': False, 'shape': (length,)})
+    return header.getvalue()
+
+
+class TransactionWriter:
+    """
+    Writes the transaction database in compressed sparse row form as .npy files. The arrays are streamed into
+    temporary .npy files behind a header of length 0, since their lengths are only known at the end. The header has
+    space for any length, so it is rewritten in place and the files are renamed when they are complete.
+    """
+
+    def __init__(self, transaction_db_path):
+        """
+        :param transaction_db_path: the directory of the transaction database
+        """
+        self.transaction_db_path = transaction_db_path
+        self.items = array('I')
+        self.entities = array('I')
+        self.item_count = 0
+        self.transaction_count = 0
+        self.dtypes = {items_name: np.uint32, entities_name: np.uint32, offsets_name: np.int64}
+        for dtype in self.dtypes.values():
+            if len(npy_header(dtype, 0)) != len(npy_header(dtype, np.iinfo(np.int64).max)):
+                raise ValueError('The .npy header of numpy ' + np.__version__ + ' cannot be rewritten in place, '
+                                 'numpy 1.23 or newer is needed')
+        self.items_file = self.open_array(items_name)
+        self.entities_file = self.open_array(entities_name)
+        self.offsets_file = self.open_array(offsets_name)
+        self.offsets = array('q', [0])
+
+    def path(self, name):
+        """
+        :param name: the file name of an array
+        :return: the path of the array
+        """
+        return os.path.join(self.transaction_db_path, name)
+
+    def open_array(self, name):
+        """
+        Opens the temporary file of an array and writes the header of an empty array.
+        :param name: the file name of the array
+        :return: the file
+        """
+        file = open(self.path(name) + '.tmp', 'wb')
+        file.write(npy_header(self.dtypes[name], 0))
+        return file
+
+    def add(self, entity, transaction):
+        """
+        Adds a transaction.
+        :param entity: the Wikidata item of the transaction, for example 'Q42'
+        :param transaction: the sorted item ids
+        :return:
+        """
+        self.items.extend(transaction)
+        self.item_count += len(transaction)
+        self.offsets.append(self.item_count)
+        self.entities.append(int(entity[1:]))
+        self.transaction_count += 1
+        if len(self.items) >= buffer_size or len(self.entities) >= buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered arrays to the temporary files.
+        """
+        self.items.tofile(self.items_file)
+        self.entities.tofile(self.entities_file)
+        self.offsets.tofile(self.offsets_file)
+        self.items = array('I')
+        self.entities = array('I')
+        self.offsets = array('q')
+
+    def close(self):
+        """
+        Writes the lengths into the headers of the temporary files and renames them to the .npy files.
+        """
+        self.flush()
+        for file, name, length in ((self.items_file, items_name, self.item_count),
+                                   (self.entities_file, entities_name, self.transaction_count),
+                                   (self.offsets_file, offsets_name, self.transaction_count + 1)):
+            file.seek(0)
+            file.write(npy_header(self.dtypes[name], length))
+            file.close()
+            os.replace(self.path(name) + '.tmp', self.path(name))
+
+
+def load_transactions(transaction_db_path):
+    """
+    Memory maps the transaction database in compressed sparse row form.
+    :param transaction_db_path: the directory of the transaction database
+    :return: tuple of (offsets, items, entities) arrays
+    """
+    return tuple(np.load(os.path.join(transaction_db_path, name), mmap_mode='r') for name in
+                 (offsets_name, items_name, entities_name))